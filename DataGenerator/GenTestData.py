@@ -1,4 +1,4 @@
-import random, csv
+import random, argparse
 from datetime import timedelta, datetime
 from faker import Faker
 from faker.providers import person
@@ -11,6 +11,9 @@ from faker.providers import date_time
 from timeit import default_timer as timer
 import json
 
+from dataRNG import RNGStreams
+from dataSchema import SCHEMA_FORMATS, compileSchema, loadSchema, registerRows, writeDataset
+
 fake = Faker()
 fake.add_provider(person)
 fake.add_provider(internet)
@@ -41,70 +44,111 @@ def birth_and_start_date_on_windows():
     random_second = random.randint(0,delta_in_seconds)
     return {'birth_date':bd.strftime('%m/%d/%Y'), 'start_date': (bd+timedelta(seconds=random_second)).strftime('%m/%d/%Y')}
 
+#generate a map of real office to fake office
+OFFICES = ['New York','Austin','Seattle','Chicago']
+#codify the hierarchical structure
+ALLOWED_ORGS_PER_OFFICE = {'New York':['Sales'],'Austin':['Devops','Platform','Product','Internal Tools'],'Chicago':['Devops'], 'Seattle':['Internal Tools','Product']}
+ALLOWED_TITLES_PER_ORG = {
+    'Devops':['Engineer','Senior Engineer','Manager'],
+    'Sales':['Associate'],
+    'Platform':['Engineer'],
+    'Product':['Manager','VP'],
+    'Internal Tools':['Engineer','Senior Engineer','VP','Manager']
+}
+TITLE_AND_SALARY_RANGE = {'Engineer':[90,120],'Senior Engineer':[110,140],'Manager':[130,150],'Associate':[60,80],'VP':[150,250]}
+BONUS_RATIO = [0.15, 0.2]
+
 def title_office_org():
-    #generate a map of real office to fake office
-    offices = ['New York','Austin','Seattle','Chicago']
-    #codify the hierarchical structure
-    allowed_orgs_per_office = {'New York':['Sales'],'Austin':['Devops','Platform','Product','Internal Tools'],'Chicago':['Devops'], 'Seattle':['Internal Tools','Product']}
-    allowed_titles_per_org = {
-        'Devops':['Engineer','Senior Engineer','Manager'],
-        'Sales':['Associate'],
-        'Platform':['Engineer'],
-        'Product':['Manager','VP'],
-        'Internal Tools':['Engineer','Senior Engineer','VP','Manager']
-    }
-
-    office = random.choice(offices)
-    org = random.choice(allowed_orgs_per_office[office])
-    title = random.choice(allowed_titles_per_org[org])
+    office = random.choice(OFFICES)
+    org = random.choice(ALLOWED_ORGS_PER_OFFICE[office])
+    title = random.choice(ALLOWED_TITLES_PER_ORG[org])
     return {'office':office, 'title':title,'org': org}
 
 def salary_and_bonus():
     salary = round(random.randint(90000,120000)/1000)*1000
-    bonus_ratio = random.uniform(0.15,0.2)
+    bonus_ratio = random.uniform(*BONUS_RATIO)
     bonus = round(salary*bonus_ratio/500)*500
     return {'salary':salary,'bonus':bonus}
 
 def title_office_org_salary_bonus():
     position = title_office_org()
-    title_and_salary_range = {'Engineer':[90,120],'Senior Engineer':[110,140],'Manager':[130,150],'Associate':[60,80],'VP':[150,250]}
-    salary_range = title_and_salary_range[position['title']]
+    salary_range = TITLE_AND_SALARY_RANGE[position['title']]
 
     salary = round(random.randint(1000*salary_range[0],1000*salary_range[1])/1000)*1000
-    bonus_ratio = random.uniform(0.15,0.2)
+    bonus_ratio = random.uniform(*BONUS_RATIO)
     bonus = round(salary*bonus_ratio/500)*500
     position.update({'salary':salary,'bonus':bonus})
     return position
 
-d = dict()
-d['first_name_and_gender'] = first_name_and_gender
-d['last_name'] = lambda: {'last_name':fake.last_name()}
-d['personal_email'] = lambda: {'email':fake.email()}
-d['ssn'] = lambda: {'ssn':fake.ssn()}
-d['birth_and_start_date'] = birth_and_start_date
-d['title_office_org_salary_bonus'] = title_office_org_salary_bonus
-d['accrued_holidays']  = lambda: {'accrued_holiday':random.randint(0,20)}
-d['transaction_value'] = lambda: {'transaction_value':random.randint(1,20000)}
-
-numRows = 1000
-#f = open('fakedata.json', 'w')
-csvfile = open('fakedata.csv', 'w', newline='')
-head = True
-start = timer()
-start_time = datetime.now() 
-
-for _ in range(numRows):
-    row = {key: val for k in d.keys() for key,val in d[k]().items()}
-    if head:
-        head = False
-        fieldnames = row.keys()
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames, quoting=csv.QUOTE_NONNUMERIC)
-        writer.writeheader()
-    # print(json.dumps(row))
-    writer.writerow(row)
-
-end = timer()
-time_elapsed = datetime.now() - start_time 
-csvfile.close()
-print('per record Time (hh:mm:ss.ms) {}'.format(timedelta(seconds=end-start)/numRows))
-print('Clock Time (hh:mm:ss.ms) {} for {} records'.format(time_elapsed,numRows))
+def title_office_org_salary_bonus_fields():
+    """Schema fields drawing whole columns of title_office_org_salary_bonus().
+
+    office -> org -> title is flattened into one tree sampler, the salary
+    range comes with the drawn title and the bonus is a ratio of it.
+    """
+    tree = {office: {org: ALLOWED_TITLES_PER_ORG[org] for org in ALLOWED_ORGS_PER_OFFICE[office]} for office in OFFICES}
+    ranges = {title: [1000*low, 1000*high] for title, (low, high) in TITLE_AND_SALARY_RANGE.items()}
+    return [
+        {'name': 'title_office_org_salary_bonus', 'generator': 'hierarchy', 'levels': ['office', 'org', 'title'], 'tree': tree,
+         'value': 'salary', 'ranges': ranges, 'round': 1000, 'columns': ['office', 'title', 'org', 'salary']},
+        {'name': 'bonus', 'generator': 'ratio', 'of': 'salary', 'low': BONUS_RATIO[0], 'high': BONUS_RATIO[1], 'round': 500},
+    ]
+
+FIELDS = dict()
+FIELDS['first_name_and_gender'] = first_name_and_gender
+FIELDS['last_name'] = lambda: {'last_name':fake.last_name()}
+FIELDS['personal_email'] = lambda: {'email':fake.email()}
+FIELDS['ssn'] = lambda: {'ssn':fake.ssn()}
+FIELDS['birth_and_start_date'] = birth_and_start_date
+FIELDS['title_office_org_salary_bonus'] = title_office_org_salary_bonus
+FIELDS['accrued_holidays']  = lambda: {'accrued_holiday':random.randint(0,20)}
+FIELDS['transaction_value'] = lambda: {'transaction_value':random.randint(1,20000)}
+registerRows(FIELDS)
+
+def default_schema():
+    # registered fields are called once per row, the date and position fields are vectorized
+    fields = []
+    for k in FIELDS:
+        if k == 'title_office_org_salary_bonus':
+            fields.extend(title_office_org_salary_bonus_fields())
+        elif k == 'birth_and_start_date':
+            # same 18-40 year gap as birth_and_start_date(), formatted from a day table
+            fields.append({'name': k, 'generator': 'date_pair', 'columns': ['birth_date', 'start_date']})
+        else:
+            fields.append({'name': k, 'generator': 'row'})
+    return {'name': 'fakedata', 'rows': 1000, 'output': 'fakedata.csv', 'fields': fields}
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Generate test data from a schema.')
+    parser.add_argument('-s', '--schema', type=str, default=None, help='JSON/YAML schema (default: the built-in row fields)')
+    parser.add_argument('-n', '--rows',   type=int, default=None, help='#rows (default from the schema)')
+    parser.add_argument('-o', '--output', type=str, default=None, help='output file (default from the schema)')
+    parser.add_argument('-f', '--format', type=str, default='csv', choices=SCHEMA_FORMATS, help='csv or JSON lines')
+    parser.add_argument('-B', '--batch',  type=int, default=10000, help='rows per vectorized batch')
+    parser.add_argument('--seed',         type=int, default=None, help='random seed (default fresh entropy, printed to repeat the run)')
+    return parser.parse_args()
+
+def main():
+    args = get_args()
+    rngs = RNGStreams(args.seed)
+    if args.seed is None:
+        print('seed {}'.format(rngs.entropy))
+    # random and Faker serve the row functions and the Faker pools
+    rngs.seedGlobals(fake)
+    schema = loadSchema(args.schema) if args.schema else default_schema()
+    numRows = args.rows if args.rows is not None else schema.get('rows', 1000)
+    output = args.output or schema.get('output') or schema.get('name', 'dataset') + '.' + args.format
+
+    start = timer()
+    start_time = datetime.now()
+
+    plan = compileSchema(schema, fake=fake, seed=rngs)
+    writeDataset(plan.batches(numRows, args.batch), output, fmt=args.format)
+
+    end = timer()
+    time_elapsed = datetime.now() - start_time
+    print('per record Time (hh:mm:ss.ms) {}'.format(timedelta(seconds=end-start)/max(numRows, 1)))
+    print('Clock Time (hh:mm:ss.ms) {} for {} records'.format(time_elapsed,numRows))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+
+"""Benchmarks for the DataGenerator pipeline.
+
+Every stage (ID generation, profiles, deposit drawing, CSV / JSON / gzip
+writing, the processDeposits engines and generation streamed straight
+into processDepositStream) is timed on its own, at several scales, best
+of --repeat runs; setup such as drawing the deposits to be written is
+not timed. Results go to a JSON file. Given a --baseline (a
+previous results file) every stage is compared with it and stages slower
+by more than --tolerance are reported as regressions (exit status 1);
+stages too short to time reliably (--min-seconds) are never flagged.
+"""
+
+import argparse, contextlib, csv, io, json, os, platform, sys, tempfile
+
+import numpy as np
+
+from timeit import default_timer as timer
+from datetime import datetime
+
+import dataGenerate, dataProcess
+from dataSerialize import ENCODERS, serializer, useSerializer
+from dataCompress import compressOpen, useCompression
+from dataRNG import RNGStreams
+
+STAGES = ["ids", "faker", "pooled", "deposits", "csv", "json", "gzip", "decimal", "chunked", "mmap", "stream"]
+# fake.profile() runs at a few hundred a second, larger scales are skipped
+LIMITS = {"faker": 10000}
+
+def getArgs():
+  parser = argparse.ArgumentParser(description='Benchmark the test data pipeline.')
+  parser.add_argument('-n', '--scales',   type=str, default="1000,10000,100000", help='comma separated record counts')
+  parser.add_argument('-t', '--stages',   type=str, default=",".join(STAGES), help='comma separated stages: ' + ",".join(STAGES))
+  parser.add_argument('-r', '--repeat',   type=int, default=3, help='runs per stage and scale, the best one counts')
+  parser.add_argument('-o', '--output',   type=str, default="bench.json", help='results file')
+  parser.add_argument('--baseline',       type=str, default=None, help='results file to compare against')
+  parser.add_argument('--tolerance',      type=float, default=0.20, help='allowed slowdown vs the baseline (0.20 = 20%%)')
+  parser.add_argument('--min-seconds',    type=float, default=0.05, help='baseline timings below this are too noisy to flag')
+  parser.add_argument('--seed',           type=int, default=1234, help='random seed')
+  parser.add_argument('-j', '--encoder',  type=str, default="auto", choices=ENCODERS, help='JSON encoder')
+  parser.add_argument('--workdir',        type=str, default=None, help='scratch directory (default a temporary one)')
+  args = parser.parse_args()
+  args.scales = [int(n) for n in args.scales.split(",") if n]
+  args.stages = [s for s in args.stages.split(",") if s]
+  for s in args.stages:
+    if s not in STAGES:
+      parser.error('--stages: unknown stage {}'.format(s))
+  return args
+
+class BenchContext:
+  """Seed, scratch directory and the untimed inputs shared between stages."""
+  def __init__(self, workdir, seed=1234):
+    self.workdir = workdir
+    self.seed    = seed
+    self.rngs    = RNGStreams(seed)
+    self.cache   = {}
+
+  def path(self, name):
+    return os.path.join(self.workdir, name)
+
+  def cached(self, key, make):
+    if key not in self.cache:
+      self.cache[key] = make()
+    return self.cache[key]
+
+  def ids(self, n):
+    return self.cached(("ids", n), lambda: (dataGenerate.genCustomerIDs(n, seed=self.rngs.named("customer-ids").seed()),
+                                            dataGenerate.genBankIDs(max(n // 50, 1), seed=self.rngs.named("bank-ids").seed())))
+
+  def pool(self):
+    return self.cached("pool", lambda: dataGenerate.makePool(self.seed, key=self.seed))
+
+  def columns(self, n):
+    def make():
+      customers, banks = self.ids(n)
+      start, end = dataGenerate.depositWindow()
+      return dataGenerate.genDepositBatch(self.rngs.named("deposits").generator(), customers, banks, n, start, end)
+    return self.cached(("columns", n), make)
+
+  def depositFile(self, n):
+    def make():
+      customers, banks = self.ids(n)
+      fname = self.path("deposits-{}".format(n))
+      dataGenerate.generateDepositsBatch(customers, banks, num=n, fname=fname, seed=self.seed)
+      return fname
+    return self.cached(("file", n), make)
+
+# each stage prepares its inputs and returns the (timed) work as a thunk
+
+def benchIDs(ctx, n):
+  return lambda: dataGenerate.genCustomerIDs(n, seed=ctx.seed).take(np.arange(n))
+
+def benchFaker(ctx, n):
+  ids = ctx.ids(n)[0]
+  return lambda: [p for p in dataGenerate.iterCustomers(ids)]
+
+def benchPooled(ctx, n):
+  ids, pool = ctx.ids(n)[0], ctx.pool()
+  return lambda: [p for p in dataGenerate.iterCustomers(ids, pool)]
+
+def benchDeposits(ctx, n):
+  customers, banks = ctx.ids(n)
+  start, end = dataGenerate.depositWindow()
+  return lambda: dataGenerate.genDepositBatch(ctx.rngs.named("deposits").generator(), customers, banks, n, start, end)
+
+def csvRows(cols):
+  return zip(*([cols["timestamp_csv"]] + [cols[f] for f in dataGenerate.DEPOSIT_FIELDS[1:]]))
+
+def benchCSV(ctx, n):
+  cols = ctx.columns(n)
+  def run():
+    with open(ctx.path("bench.csv"), "w", newline='') as f:
+      csv.writer(f, quoting=csv.QUOTE_NONNUMERIC).writerows(csvRows(cols))
+  return run
+
+def benchJSON(ctx, n):
+  cols = ctx.columns(n)
+  def run():
+    with open(ctx.path("bench.json"), "w") as f:
+      f.write(serializer().columns(cols, dataGenerate.DEPOSIT_FIELDS, dataGenerate.DEPOSIT_KINDS))
+  return run
+
+def benchGzip(ctx, n):
+  cols = ctx.columns(n)
+  def run():
+    with compressOpen(ctx.path("bench.csv.gz"), "wt", newline='') as f:
+      csv.writer(f, quoting=csv.QUOTE_NONNUMERIC).writerows(csvRows(cols))
+  return run
+
+def benchDecimal(ctx, n):
+  fname = ctx.depositFile(n)
+  return lambda: dataProcess.processDeposits(fname=fname)
+
+def benchChunked(ctx, n):
+  fname = ctx.depositFile(n)
+  return lambda: dataProcess.processDepositsChunked(fname=fname)
+
+def benchMapped(ctx, n):
+  fname = ctx.depositFile(n)
+  return lambda: dataProcess.processDepositsMapped(fname=fname)
+
+def benchStream(ctx, n):
+  # generate and aggregate in memory, the write + read round trip skipped
+  customers, banks = ctx.ids(n)
+  return lambda: dataProcess.processDepositStream(dataGenerate.iterDeposits(customers, banks, num=n, seed=ctx.seed))
+
+BENCHES = {
+  "ids":      benchIDs,
+  "faker":    benchFaker,
+  "pooled":   benchPooled,
+  "deposits": benchDeposits,
+  "csv":      benchCSV,
+  "json":     benchJSON,
+  "gzip":     benchGzip,
+  "decimal":  benchDecimal,
+  "chunked":  benchChunked,
+  "mmap":     benchMapped,
+  "stream":   benchStream,
+}
+
+def timeStage(ctx, stage, n, repeat=3):
+  """Best wall time in seconds of repeat runs of stage at n records."""
+  run = BENCHES[stage](ctx, n)
+  best = None
+  for _ in range(repeat):
+    # the processors print their totals, keep them out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+      start = timer()
+      run()
+      elapsed = timer() - start
+    best = elapsed if best is None else min(best, elapsed)
+  return best
+
+def runBenchmarks(stages, scales, workdir, seed=1234, repeat=3):
+  ctx = BenchContext(workdir, seed)
+  results = []
+  for stage in stages:
+    for n in scales:
+      if n > LIMITS.get(stage, n):
+        continue
+      seconds = timeStage(ctx, stage, n, repeat)
+      results.append({"stage": stage, "records": n, "seconds": seconds, "rate": n / seconds if seconds else None})
+      print('{:10s} {:>10,d} records {:10.4f} s {:>14,.0f} rec/s'.format(stage, n, seconds, n / seconds if seconds else 0))
+  return results
+
+def compareBaseline(results, baseline, tolerance=0.20, minSeconds=0.05):
+  """Regressions (stage, records, seconds, baseline seconds, ratio) vs baseline.
+
+  Only stages that took at least minSeconds in the baseline can regress.
+  """
+  reference = {(r["stage"], r["records"]): r["seconds"] for r in baseline["results"]}
+  regressions = []
+  for r in results:
+    before = reference.get((r["stage"], r["records"]))
+    if not before:
+      continue
+    ratio = r["seconds"] / before
+    flag = 'REGRESSION' if ratio > 1 + tolerance and before >= minSeconds else ''
+    print('{:10s} {:>10,d} records {:10.4f} s vs {:10.4f} s {:7.2f}x {}'.format(r["stage"], r["records"], r["seconds"], before, ratio, flag))
+    if flag:
+      regressions.append((r["stage"], r["records"], r["seconds"], before, ratio))
+  return regressions
+
+def main():
+  args = getArgs()
+  print(args)
+  useSerializer(args.encoder)
+  useCompression()
+
+  if args.workdir:
+    os.makedirs(args.workdir, exist_ok=True)
+    results = runBenchmarks(args.stages, args.scales, args.workdir, args.seed, args.repeat)
+  else:
+    with tempfile.TemporaryDirectory() as workdir:
+      results = runBenchmarks(args.stages, args.scales, workdir, args.seed, args.repeat)
+
+  report = {
+    "created":  datetime.now().isoformat(),
+    "python":   platform.python_version(),
+    "platform": platform.platform(),
+    "cpus":     os.cpu_count(),
+    "encoder":  serializer().name,
+    "seed":     args.seed,
+    "repeat":   args.repeat,
+    "results":  results,
+  }
+  with open(args.output, "w") as f:
+    json.dump(report, f, indent=2)
+  print('##### results written to {}'.format(args.output))
+
+  if args.baseline:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+    regressions = compareBaseline(results, baseline, args.tolerance, args.min_seconds)
+    print('##### {} regressions beyond {:.0%} vs {}'.format(len(regressions), args.tolerance, args.baseline))
+    if regressions:
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+"""Multi-threaded compression for the generated text files.
+
+gzip output is written pigz style: the stream is cut into blocks that are
+deflated independently on a thread pool and written as consecutive gzip
+members, which any gzip reader decompresses as one file. Every member
+carries its own size in a 'DG' extra subfield (like BGZF does), so our
+reader can hand whole members to threads; other gzip files fall back to
+the sequential gzip module. zstd is optional and needs zstandard.
+"""
+
+import gzip, io, os, struct, zlib
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+CODECS     = ["gzip", "zstd"]
+SUFFIXES   = {"gzip": ".gz", "zstd": ".zst"}
+BLOCK_SIZE = 1 << 20
+HEADER     = struct.Struct('<BBBBIBBHBBHI')   # gzip header + XLEN + one 'DG' subfield
+TRAILER    = struct.Struct('<II')
+
+_settings = {"codec": "gzip", "level": 9, "threads": None}
+
+def useCompression(codec="gzip", level=9, threads=None):
+  if codec == "zstd" and zstandard is None:
+    raise ImportError('--codec zstd needs zstandard (pip install zstandard)')
+  _settings.update(codec=codec, level=level, threads=threads)
+
+def compressSuffix():
+  return SUFFIXES[_settings["codec"]]
+
+def defaultThreads(threads=None):
+  return threads if threads else (os.cpu_count() or 1)
+
+def gzipMember(data, level):
+  deflate = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+  body = deflate.compress(data) + deflate.flush()
+  xfl = 2 if level == 9 else (4 if level == 1 else 0)
+  size = HEADER.size + len(body) + TRAILER.size
+  # FLG=FEXTRA, MTIME=0 and OS=unknown keep members reproducible
+  header = HEADER.pack(0x1f, 0x8b, 8, 4, 0, xfl, 255, 8, ord('D'), ord('G'), 4, size)
+  return header + body + TRAILER.pack(zlib.crc32(data), len(data) & 0xffffffff)
+
+class ParallelGzipWriter(io.RawIOBase):
+  """Binary writer deflating BLOCK_SIZE blocks as gzip members in threads.
+
+  At most 2 * threads blocks are in flight, members are written in order.
+  """
+  def __init__(self, path, level=9, threads=None, blockSize=BLOCK_SIZE):
+    self.file      = open(path, 'wb')
+    self.level     = level
+    self.threads   = defaultThreads(threads)
+    self.blockSize = blockSize
+    self.pool      = ThreadPoolExecutor(self.threads)
+    self.pending   = deque()
+    self.buffer    = bytearray()
+    self.members   = 0
+
+  def writable(self):
+    return True
+
+  def write(self, data):
+    self.buffer += data
+    while len(self.buffer) >= self.blockSize:
+      self.submit(bytes(self.buffer[:self.blockSize]))
+      del self.buffer[:self.blockSize]
+    return len(data)
+
+  def submit(self, block):
+    self.pending.append(self.pool.submit(gzipMember, block, self.level))
+    self.members += 1
+    while len(self.pending) > 2 * self.threads:
+      self.file.write(self.pending.popleft().result())
+
+  def close(self):
+    if self.closed:
+      return
+    if self.buffer or not self.members:
+      self.submit(bytes(self.buffer))
+      self.buffer = bytearray()
+    while self.pending:
+      self.file.write(self.pending.popleft().result())
+    self.pool.shutdown()
+    self.file.close()
+    super().close()
+
+def memberSize(header):
+  # size from the 'DG' subfield of one of our members, None for other gzip
+  if len(header) < HEADER.size:
+    return None
+  magic1, magic2, method, flags, mtime, xfl, osys, xlen, si1, si2, slen, size = HEADER.unpack(header)
+  if (magic1, magic2, method) != (0x1f, 0x8b, 8) or not flags & 4 or xlen != 8 or (si1, si2, slen) != (ord('D'), ord('G'), 4):
+    return None
+  return size
+
+def gunzipMember(member):
+  return zlib.decompress(member, 16 + zlib.MAX_WBITS)
+
+class ParallelGzipReader(io.RawIOBase):
+  """Binary reader inflating the members of a ParallelGzipWriter file in threads.
+
+  offset, when given, must be the start of a member.
+  """
+  def __init__(self, path, threads=None, offset=0):
+    self.file    = open(path, 'rb')
+    self.file.seek(offset)
+    self.threads = defaultThreads(threads)
+    self.pool    = ThreadPoolExecutor(self.threads)
+    self.pending = deque()
+    self.buffer  = memoryview(b'')
+    self.eof     = False
+
+  def readable(self):
+    return True
+
+  def fill(self):
+    while not self.eof and len(self.pending) < 2 * self.threads:
+      header = self.file.read(HEADER.size)
+      if not header:
+        self.eof = True
+        break
+      size = memberSize(header)
+      if size is None:
+        raise IOError('{} is not a parallel gzip file'.format(self.file.name))
+      self.pending.append(self.pool.submit(gunzipMember, header + self.file.read(size - HEADER.size)))
+
+  def readinto(self, b):
+    while not self.buffer:
+      self.fill()
+      if not self.pending:
+        return 0
+      self.buffer = memoryview(self.pending.popleft().result())
+    n = min(len(b), len(self.buffer))
+    b[:n] = self.buffer[:n]
+    self.buffer = self.buffer[n:]
+    return n
+
+  def close(self):
+    if self.closed:
+      return
+    self.pool.shutdown()
+    self.file.close()
+    super().close()
+
+def isParallelGzip(path, offset=0):
+  with open(path, 'rb') as f:
+    f.seek(offset)
+    return memberSize(f.read(HEADER.size)) is not None
+
+class GzipTail(gzip.GzipFile):
+  """gzip.GzipFile reading path from a member boundary on, owns the file."""
+  def __init__(self, path, offset):
+    self.source = open(path, 'rb')
+    self.source.seek(offset)
+    super().__init__(fileobj=self.source, mode='rb')
+
+  def close(self):
+    try:
+      super().close()
+    finally:
+      self.source.close()
+
+def openWriter(path):
+  """Binary writer for path with the codec, level and threads in use."""
+  codec, level, threads = _settings["codec"], _settings["level"], _settings["threads"]
+  if codec == "zstd":
+    compressor = zstandard.ZstdCompressor(level=level, threads=defaultThreads(threads))
+    return compressor.stream_writer(open(path, 'wb'), closefd=True)
+  return ParallelGzipWriter(path, level=level, threads=threads)
+
+def compressOpen(fname, mode="wt", newline=None):
+  # text mode counterpart of gzip.open(fname, "wt") for the writers
+  return io.TextIOWrapper(openWriter(fname), newline=newline)
+
+def openReader(path, threads=None, offset=0):
+  """Binary reader for a .gz (parallel when possible) or .zst file.
+
+  A non zero offset starts reading at that compressed byte, which has to
+  be a gzip member or zstd frame boundary (e.g. the size before an append).
+  """
+  threads = threads or _settings["threads"]
+  if path.endswith('.zst'):
+    if zstandard is None:
+      raise ImportError('{} needs zstandard (pip install zstandard)'.format(path))
+    f = open(path, 'rb')
+    f.seek(offset)
+    # buffered like the parallel gzip reader, the raw stream has no readline()
+    return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True, closefd=True), buffer_size=BLOCK_SIZE)
+  if isParallelGzip(path, offset):
+    return io.BufferedReader(ParallelGzipReader(path, threads=threads, offset=offset), buffer_size=BLOCK_SIZE)
+  if offset:
+    return GzipTail(path, offset)
+  return gzip.open(path, 'rb')
+
+def decompressOpen(path, mode="rt", newline=None):
+  # text mode counterpart of gzip.open(path, "rt") for the readers
+  return io.TextIOWrapper(openReader(path), newline=newline)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+"""Batched date generation on integer day numbers.
+
+Dates are drawn as datetime64[D] day numbers with NumPy and only turned
+into text at the end, through a table holding the formatted string of
+every day in the range seen so far: a date column costs one integer draw
+and one table lookup per row, strftime runs once per distinct day.
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+
+DATE_FORMAT   = '%m/%d/%Y'
+DAYS_PER_YEAR = 365.24
+EPOCH         = date(1970, 1, 1)
+
+def today():
+  return np.datetime64(date.today(), 'D')
+
+class DayFormatter:
+  """Cached day number -> string table for one strftime format."""
+  def __init__(self, fmt=DATE_FORMAT):
+    self.fmt   = fmt
+    self.first = None
+    self.table = np.zeros(0, dtype=object)
+
+  def extend(self, first, last):
+    if self.first is not None and first >= self.first and last < self.first + len(self.table):
+      return
+    if self.first is not None:
+      first, last = min(first, self.first), max(last, self.first + len(self.table) - 1)
+    # one strftime per day of the (grown) range
+    self.table = np.array([(EPOCH + timedelta(days=d)).strftime(self.fmt) for d in range(first, last + 1)], dtype=object)
+    self.first = first
+
+  def format(self, days):
+    """Strings of datetime64[D] (or integer day number) values."""
+    days = np.asarray(days).astype('datetime64[D]').astype(np.int64)
+    if not len(days):
+      return np.zeros(0, dtype=object)
+    self.extend(int(days.min()), int(days.max()))
+    return self.table[days - self.first]
+
+def birthAndStartDays(rng, num, startYears=20, minAge=18, maxAge=40, end=None):
+  """(birth, start) datetime64[D] columns like GenTestData.birth_and_start_date().
+
+  start is uniform over the last startYears years up to end (today), the
+  birth day 365 * randint(minAge, maxAge) days before it.
+  """
+  end = today() if end is None else np.datetime64(end, 'D')
+  first = end - np.timedelta64(int(DAYS_PER_YEAR * startYears), 'D')
+  start = first + rng.integers(0, (end - first).astype(np.int64) + 1, num).astype('timedelta64[D]')
+  birth = start - (365 * rng.integers(minAge, maxAge + 1, num)).astype('timedelta64[D]')
+  return birth, start
+
+def windowsBirthAndStartDays(rng, num, end=None):
+  """(birth, start) datetime64[D] columns like GenTestData.birth_and_start_date_on_windows().
+
+  Works in seconds as the original does (birth within 40 years of 1960,
+  the start offset bounded by now minus an earliest start up to 18 years
+  after birth) and truncates to days at the end.
+  """
+  end = np.datetime64('now', 's') if end is None else np.datetime64(end, 's')
+  birth = np.datetime64('1960-01-01T00:00:00', 's') + rng.integers(0, 1261600000 + 1, num).astype('timedelta64[s]')
+  earliest = birth + rng.integers(0, 567720000 + 1, num).astype('timedelta64[s]')
+  span = (end - earliest).astype(np.int64)
+  start = birth + np.floor(rng.random(num) * (span + 1)).astype(np.int64).astype('timedelta64[s]')
+  return birth.astype('datetime64[D]'), start.astype('datetime64[D]')
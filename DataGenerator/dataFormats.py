@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+"""Columnar (Parquet / Arrow IPC) files for the generated test data.
+
+pyarrow is optional: it is only needed when --format parquet or arrow is
+asked for, the CSV/JSON path never touches this module's writers.
+"""
+
+import numpy as np
+
+from dataIDs import IDAllocator
+
+try:
+  import pyarrow as pa
+  import pyarrow.parquet as pq
+except ImportError:
+  pa = None
+  pq = None
+
+FORMATS = ["csv", "parquet", "arrow"]
+
+BLOOD_GROUPS = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+SEXES        = ["F", "M"]
+TYPES        = ["cashdepo", "bankxfer"]
+
+def requireArrow(fmt):
+  if pa is None:
+    raise ImportError('--format {} needs pyarrow (pip install pyarrow)'.format(fmt))
+
+def columnarName(fname, fmt):
+  return fname + "." + fmt
+
+def depositSchema():
+  ids = pa.dictionary(pa.int32(), pa.string())
+  return pa.schema([
+    ("timestamp",     pa.timestamp('us')),
+    ("type",          pa.dictionary(pa.int8(), pa.string())),
+    ("amount",        pa.decimal128(18, 2)),
+    ("to_customer",   ids),
+    ("to_bank",       ids),
+    ("to_account",    pa.string()),
+    ("from_customer", ids),
+    ("from_bank",     ids),
+    ("from_account",  pa.string()),
+  ])
+
+def customerSchema():
+  return pa.schema([
+    ("job",              pa.string()),
+    ("company",          pa.string()),
+    ("ssn",              pa.string()),
+    ("residence",        pa.string()),
+    ("current_location", pa.list_(pa.float64())),
+    ("blood_group",      pa.dictionary(pa.int8(), pa.string())),
+    ("website",          pa.list_(pa.string())),
+    ("username",         pa.string()),
+    ("name",             pa.string()),
+    ("sex",              pa.dictionary(pa.int8(), pa.string())),
+    ("address",          pa.string()),
+    ("mail",             pa.string()),
+    ("birthdate",        pa.date32()),
+    ("ID",               pa.string()),
+  ])
+
+def centsToDecimal(cents):
+  # decimal128 holds the unscaled value as two little endian 64-bit words
+  words = np.empty((len(cents), 2), dtype=np.int64)
+  words[:, 0] = cents
+  words[:, 1] = cents >> 63
+  return pa.Array.from_buffers(pa.decimal128(18, 2), len(cents), [None, pa.py_buffer(words)])
+
+def decimalToCents(array):
+  # inverse of centsToDecimal, every amount fits the low word
+  words = np.frombuffer(array.buffers()[1], dtype=np.int64)
+  return words[2 * array.offset:2 * (array.offset + len(array)):2]
+
+def dictionaryColumn(indices, ids, dictionary=None, valid=None):
+  """Dictionary-encode positions into ids, nulls where not valid.
+
+  Without a prebuilt dictionary only the ids used by this batch are
+  formatted, which is what Parquet wants; Arrow IPC files need the same
+  dictionary every batch.
+  """
+  if dictionary is None:
+    keep = np.unique(indices if valid is None else indices[valid])
+    indices = np.searchsorted(keep, indices).clip(0, max(len(keep) - 1, 0))
+    dictionary = pa.array(ids.take(keep), pa.string())
+  mask = None if valid is None else ~valid
+  return pa.DictionaryArray.from_arrays(pa.array(indices.astype(np.int32), pa.int32(), mask=mask), dictionary)
+
+def idDictionary(ids, chunk=1 << 20):
+  """Arrow string array of all ids, built chunk by chunk.
+
+  IDAllocator IDs go from their fixed-width bytes straight into Arrow
+  buffers, so no Python string is made; other ids are converted a chunk
+  at a time.
+  """
+  parts = []
+  for first in range(0, len(ids), chunk):
+    positions = np.arange(first, min(first + chunk, len(ids)))
+    if isinstance(ids, IDAllocator):
+      chars = ids.chars(positions)
+      part = pa.Array.from_buffers(pa.binary(ids.width()), len(positions), [None, pa.py_buffer(chars)])
+      parts.append(part.cast(pa.string()))
+    else:
+      parts.append(pa.array(ids.take(positions), pa.string()))
+  return pa.concat_arrays(parts) if parts else pa.array([], pa.string())
+
+def fixedDictionary(values, categories):
+  lookup = {v: i for i, v in enumerate(categories)}
+  indices = np.array([lookup[v] for v in values], dtype=np.int8)
+  return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int8()), pa.array(categories, pa.string()))
+
+def openColumnar(fname, fmt, schema, zip=False):
+  requireArrow(fmt)
+  if fmt == "parquet":
+    return pq.ParquetWriter(columnarName(fname, fmt), schema, compression="gzip" if zip else "snappy")
+  options = pa.ipc.IpcWriteOptions(compression="zstd" if zip else None)
+  return pa.ipc.new_file(columnarName(fname, fmt), schema, options=options)
+
+def writeBatch(writer, batch):
+  if isinstance(writer, pq.ParquetWriter):
+    writer.write_table(pa.Table.from_batches([batch]))
+  else:
+    writer.write_batch(batch)
+
+class DepositWriter:
+  """Stream drawn deposit batches (see drawDeposits) into one columnar file.
+
+  Timestamps are timestamp[us], amounts decimal128(18,2) built straight
+  from integer cents, and customer/bank IDs dictionary-encoded positions
+  into the indexed IDs (anything with take()) the batches were drawn against.
+  """
+  def __init__(self, fname, fmt, customers, banks, zip=False):
+    requireArrow(fmt)
+    self.schema    = depositSchema()
+    self.writer    = openColumnar(fname, fmt, self.schema, zip=zip)
+    self.customers = customers
+    self.banks     = banks
+    self.types     = pa.array(TYPES, pa.string())
+    self.customerDict = None
+    self.bankDict     = None
+    if fmt != "parquet":
+      self.customerDict = idDictionary(customers)
+      self.bankDict     = idDictionary(banks)
+
+  def write(self, draw):
+    isBank = draw["isBank"]
+    columns = [
+      pa.array(draw["stamps"], pa.timestamp('us')),
+      pa.DictionaryArray.from_arrays(pa.array(isBank.astype(np.int8), pa.int8()), self.types),
+      centsToDecimal(np.rint(draw["amount"] * 100).astype(np.int64)),
+      dictionaryColumn(draw["toCust"], self.customers, self.customerDict),
+      dictionaryColumn(draw["toBank"], self.banks, self.bankDict),
+      pa.array(draw["toAccount"], pa.string()),
+      dictionaryColumn(draw["fromCust"], self.customers, self.customerDict, valid=isBank),
+      dictionaryColumn(draw["fromBank"], self.banks, self.bankDict, valid=isBank),
+      pa.array(draw["fromAccount"], pa.string()),
+    ]
+    writeBatch(self.writer, pa.RecordBatch.from_arrays(columns, schema=self.schema))
+
+  def close(self):
+    self.writer.close()
+
+class CustomerWriter:
+  """Buffer fake.profile() dicts and write them as typed columnar batches."""
+  def __init__(self, fname, fmt, zip=False, batch=10000):
+    requireArrow(fmt)
+    self.schema   = customerSchema()
+    self.writer   = openColumnar(fname, fmt, self.schema, zip=zip)
+    self.batch    = batch
+    self.profiles = []
+
+  def write(self, profile):
+    self.profiles.append(profile)
+    if len(self.profiles) >= self.batch:
+      self.flush()
+
+  def flush(self):
+    if not self.profiles:
+      return
+    cols = {name: [p[name] for p in self.profiles] for name in self.schema.names}
+    cols["current_location"] = [[float(x) for x in loc] for loc in cols["current_location"]]
+    arrays = []
+    for field in self.schema:
+      if field.name == "blood_group":
+        arrays.append(fixedDictionary(cols[field.name], BLOOD_GROUPS))
+      elif field.name == "sex":
+        arrays.append(fixedDictionary(cols[field.name], SEXES))
+      else:
+        arrays.append(pa.array(cols[field.name], field.type))
+    writeBatch(self.writer, pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+    self.profiles = []
+
+  def close(self):
+    self.flush()
+    self.writer.close()
+
+def depositBatches(path, columns):
+  """Yield record batches of the given columns from a Parquet or Arrow file."""
+  requireArrow(path)
+  if path.endswith(".parquet"):
+    for batch in pq.ParquetFile(path).iter_batches(columns=columns):
+      yield batch
+  else:
+    with pa.memory_map(path) as source:
+      reader = pa.ipc.open_file(source)
+      for i in range(reader.num_record_batches):
+        batch = reader.get_batch(i)
+        yield pa.RecordBatch.from_arrays([batch.column(batch.schema.get_field_index(c)) for c in columns], names=columns)
+
+def distinctValues(column):
+  # distinct non null values of a dictionary column, read off its indices
+  used = np.unique(column.indices.drop_null().to_numpy())
+  return column.dictionary.take(pa.array(used, pa.int64())).to_pylist()
+
+def depositArrays(batch):
+  """Columns of one deposits record batch as aggregation inputs.
+
+  Returns isBank, isCash, integer cents and the distinct to/from
+  customer and bank IDs seen in the batch.
+  """
+  types = batch.column(batch.schema.get_field_index("type"))
+  names = types.dictionary.to_pylist()
+  codes = types.indices.to_numpy(zero_copy_only=False)
+  isBank = codes == names.index("bankxfer") if "bankxfer" in names else np.zeros(len(codes), dtype=bool)
+  isCash = codes == names.index("cashdepo") if "cashdepo" in names else np.zeros(len(codes), dtype=bool)
+  cents = decimalToCents(batch.column(batch.schema.get_field_index("amount")))
+  ids = [distinctValues(batch.column(batch.schema.get_field_index(c))) for c in ("to_customer", "to_bank", "from_customer", "from_bank")]
+  return [isBank, isCash, cents] + ids
@@ -1,26 +1,30 @@
 #!/usr/bin/env python3
 
-import random, csv, json, argparse, uuid, os, gzip
+import random, csv, argparse, os, multiprocessing, itertools
 
-from bloom_filter import BloomFilter
-from decimal import Decimal
+import numpy as np
 from timeit import default_timer as timer
-from datetime import timedelta, datetime, date
+from datetime import timedelta, datetime
 from faker import Faker
 from faker.providers import profile
 
+from dataFormats import FORMATS, DepositWriter, CustomerWriter
+from dataIDs import IDAllocator
+from dataSerialize import ENCODERS, serializer, useSerializer
+from dataCompress import CODECS, compressOpen, compressSuffix, useCompression
+from dataProfiles import ProfilePool, UNIQUE_FIELDS
+from dataSamplers import AMOUNTS, TIMESTAMPS, DepositSamplers
+from dataGraph import GRAPH_SUFFIX, GraphBuilder
+from dataRNG import RNGStreams
+
 Faker.seed(1234)
 fake = Faker()
 
 # fake.add_provider(person)
 
-class CustomJsonEncoder(json.JSONEncoder):
-  def default(self, obj):
-    if isinstance(obj, Decimal):
-      return float(obj)
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    return super(CustomJsonEncoder, self).default(obj)
+DEPOSIT_FIELDS = ["timestamp", "type", "amount", "to_customer", "to_bank", "to_account", "from_customer", "from_bank", "from_account"]
+DEPOSIT_KINDS  = {"timestamp": "str", "type": "str", "amount": "num", "to_customer": "str", "to_bank": "str", "to_account": "str", "from_customer": "str", "from_bank": "str", "from_account": "str"}
+JSON_BATCH     = 10000
 
 def getArgs():
   parser = argparse.ArgumentParser(description='Generate test data.')
@@ -31,76 +35,120 @@ def getArgs():
   parser.add_argument('-k', '--cash',         type=float, default=0.15,  help='% of deposits in cash')
   parser.add_argument('-a', '--amount',       type=int, default=4000,    help='avgamount')
   parser.add_argument('-s', '--std',          type=int, default=3000,    help='stdamount')
-  
+  parser.add_argument('-B', '--batch',        type=int, default=0,       help='deposits per vectorized batch (0 = one at a time)')
+  parser.add_argument('--seed',               type=int, default=1234,    help='random seed, all streams (IDs, shards, Faker) derive from it')
+  parser.add_argument('-w', '--workers',      type=int, default=0,       help='processes, output goes to numbered part files (0 = single file)')
+  parser.add_argument('--day',                type=str, default=None,    help='deposit day YYYY-MM-DD (default yesterday)')
+  parser.add_argument('-p', '--profiles',     type=str, default="faker", choices=["faker", "pooled"], help='customer profiles from fake.profile() or sampled from precomputed pools')
+  parser.add_argument('--pool-size',          type=int, default=2000,    help='values per field pool with --profiles pooled')
+  parser.add_argument('--unique',             type=str, default=",".join(UNIQUE_FIELDS), help='pooled fields unique per customer, comma separated (ssn,mail or none)')
+  parser.add_argument('--customer-skew',      type=float, default=0.0,   help='Zipf exponent of customer popularity (0 = uniform), batched generator')
+  parser.add_argument('--bank-skew',          type=float, default=0.0,   help='Zipf exponent of bank popularity (0 = uniform), batched generator')
+  parser.add_argument('--amounts',            type=str, default="normal", choices=AMOUNTS, help='amount distribution, same mean and std')
+  parser.add_argument('--timestamps',         type=str, default="uniform", choices=TIMESTAMPS, help='deposit times over the day')
+  parser.add_argument('--bursts',             type=int, default=5,       help='spikes per day with --timestamps bursty')
+
 
   parser.add_argument('-fc', '--fcustomer', type=str, default="customer", help='filename (no extension)')
   parser.add_argument('-fd', '--fdeposits', type=str, default="deposits", help='filename (no extension)')
   parser.add_argument('-z',  '--gzip',      type=str2bool, nargs='?',const=True, default=False,help='Activate gzip.')
+  parser.add_argument('--codec',            type=str, default="gzip", choices=CODECS, help='compression used by -z')
+  parser.add_argument('--gzip-level',       type=int, default=9, help='compression level (gzip 1-9, zstd 1-22)')
+  parser.add_argument('--compress-threads', type=int, default=0, help='compression threads per file (0 = all cores)')
+  parser.add_argument('-j',  '--encoder',   type=str, default="auto", choices=ENCODERS, help='JSON encoder, auto uses orjson when installed')
+  parser.add_argument('-f',  '--format',    type=str, default="csv", choices=FORMATS, help='csv (CSV + JSON lines) or one columnar file')
+  parser.add_argument('--graph',            type=str2bool, nargs='?',const=True, default=False,help='Also write the bankxfer graph (CSR, ' + GRAPH_SUFFIX + ').')
   args = parser.parse_args()
+  args.unique = [f for f in args.unique.split(",") if f and f != "none"]
+  for f in args.unique:
+    if f not in UNIQUE_FIELDS:
+      parser.error('--unique: {} is not one of {}'.format(f, ",".join(UNIQUE_FIELDS)))
+  if args.customer_skew < 0 or args.bank_skew < 0:
+    parser.error('--customer-skew and --bank-skew must be >= 0')
+  if args.customers < 2 or args.banks < 2:
+    parser.error('deposits need at least 2 customers and 2 banks')
   return args
 
-def genCustomerIDs(num=10, err=0.01):
-  bloom = BloomFilter(max_elements=2*num, error_rate=err)
-  customerIDs = set()
-  for i in range(num):
-    id = uuid.uuid4()
-    while str(id) in bloom:
-      id = uuid.uuid4()
-    bloom.add(str(id))
-    customerIDs.add(str(id))
-  return customerIDs
-
-def genBankIDs(num=10, err=0.01):
-  bloom = BloomFilter(max_elements=2*num, error_rate=err)
-  bankIDs = set()
-  for i in range(num):
-    id = uuid.uuid4()
-    while "BANK-" + str(id) in bloom:
-      id = uuid.uuid4()
-    bloom.add("BANK-" + str(id))
-    bankIDs.add("BANK-" + str(id))
-  return bankIDs
-
-def writeCustomers(customerIDs, fname="customer", zip=False):
+def makeSamplers(args, rngs):
+  # None keeps the uniform draws (and their output) unchanged
+  if not (args.customer_skew or args.bank_skew or args.amounts != "normal" or args.timestamps != "uniform"):
+    return None
+  start, end = depositWindow(args.day)
+  return DepositSamplers(args.customers, args.banks, start, end, customerSkew=args.customer_skew, bankSkew=args.bank_skew,
+                         amounts=args.amounts, timestamps=args.timestamps, bursts=args.bursts, seed=rngs.named("samplers").seed())
+
+def genCustomerIDs(num=10, seed=None):
+  # unique by construction, strings are only built when a customer is used
+  return IDAllocator(num, seed=seed)
+
+def genBankIDs(num=10, seed=None):
+  return IDAllocator(num, seed=seed, prefix="BANK-")
+
+def genIDs(args, rngs):
+  # one allocator key per kind, the same IDs whether the run is sharded or not
+  return (genCustomerIDs(num=args.customers, seed=rngs.named("customer-ids").child(0).seed()),
+          genBankIDs(num=args.banks, seed=rngs.named("bank-ids").child(0).seed()))
+
+def indexIDs(ids):
+  # allocators are already indexed, any other collection is sorted once
+  if isinstance(ids, IDAllocator):
+    return ids
+  return np.array(sorted(ids), dtype=object)
+
+def makePool(seed, size=2000, unique=UNIQUE_FIELDS, key=0):
+  # pools are filled from the (seeded) fake instance, indices drawn from seed
+  return ProfilePool(fake, np.random.default_rng(seed), size=size, unique=unique, key=key)
+
+def iterCustomers(customerIDs, pool=None, batch=JSON_BATCH):
+  """Yield lists of customer profiles (with 'ID') for the customer IDs.
+
+  Without a pool every profile is a fake.profile() call, with one they
+  are sampled from its pools; slices of an allocator keep their global
+  position so pooled unique fields stay unique across shards.
+  """
+  first = getattr(customerIDs, 'start', 0)
+  ids = iter(customerIDs)
+  while True:
+    chunk = list(itertools.islice(ids, batch))
+    if not chunk:
+      return
+    if pool is None:
+      profiles = [fake.profile() for _ in chunk]
+    else:
+      profiles = pool.profiles(np.arange(first, first + len(chunk)))
+    for profile, c in zip(profiles, chunk):
+      profile['ID'] = c
+    first += len(chunk)
+    yield profiles
+
+def writeCustomers(customerIDs, fname="customer", zip=False, fmt="csv", pool=None):
+  if fmt != "csv":
+    writer = CustomerWriter(fname, fmt, zip=zip)
+    for profiles in iterCustomers(customerIDs, pool):
+      for profile in profiles:
+        writer.write(profile)
+    writer.close()
+    return
   if zip:
-    myOpen = gzip.open
+    myOpen = compressOpen
     myMode = "wt"
-    mySuffix = ".gz"
+    mySuffix = compressSuffix()
   else:
     myOpen = open
     myMode = "w"
     mySuffix = ""
   csvfile = myOpen(fname + ".csv"  + mySuffix, myMode, newline='')
   jsnfile = myOpen(fname + ".json" + mySuffix, myMode)
-  head = True
-  for c in customerIDs:
-    profile = fake.profile()
-    profile['ID'] = c
-    print(json.dumps(profile, cls=CustomJsonEncoder), file=jsnfile)
-    if head:
-      head = False
-      fieldnames = profile.keys()
-      writer = csv.DictWriter(csvfile, fieldnames=fieldnames, quoting=csv.QUOTE_NONNUMERIC)
-      writer.writeheader()
-    writer.writerow(profile)
+  writeRecords(iterCustomers(customerIDs, pool), csvfile, jsnfile)
   csvfile.close()
   jsnfile.close()
   return
 
-def generateDeposits(customerIDs, bankIDs, num=10, fname="deposits", mean=100, std=20, cash=0.10, zip=False):
-  if zip:
-    myOpen = gzip.open
-    myMode = "wt"
-    mySuffix = ".gz"
-  else:
-    myOpen = open
-    myMode = "w"
-    mySuffix = ""
-  csvfile = myOpen(fname + ".csv"  + mySuffix, myMode, newline='')
-  jsnfile = myOpen(fname + ".json" + mySuffix, myMode)
-
+def iterDepositRecords(customerIDs, bankIDs, num=10, mean=100, std=20, cash=0.10, batch=JSON_BATCH, day=None):
+  """Yield lists of up to batch deposit record dicts, one Faker draw each."""
   # create random transactions between customers (for bank deposits) and cash deposits
-  head = True
+  start, end = (bound.item() for bound in depositWindow(day))
+  records = []
   for i in range(num):
     # spin the roulette
     luck = random.random()
@@ -109,7 +157,7 @@ def generateDeposits(customerIDs, bankIDs, num=10, fname="deposits", mean=100, s
     customers = random.sample(customerIDs, numCustomers) # returns 1 or 2 customers
     banks     = random.sample(bankIDs, numCustomers) # returns 1 or 2 banks
     deposit = round(random.gauss(mean, std),2)
-    timestamp = fake.date_time_between_dates(datetime_start=(datetime.today() - timedelta(days=1)).replace(hour=1, minute=0, second=0, microsecond=0), datetime_end=(datetime.today() - timedelta(days=1)).replace(hour=23, minute=30, second=0, microsecond=0), tzinfo=None)
+    timestamp = fake.date_time_between_dates(datetime_start=start, datetime_end=end, tzinfo=None)
     record = {
       "timestamp":      timestamp,
       "type":           "bankxfer" if isBank else "cashdepo",
@@ -121,18 +169,301 @@ def generateDeposits(customerIDs, bankIDs, num=10, fname="deposits", mean=100, s
       "from_bank":      banks[1] if isBank else None,
       "from_account":   fake.iban() if isBank else None,
     }
-    # print("{} {} {} {} {} {:0.2f} {}\n{}".format(i,luck,isBank,numCustomers,customers,deposit, timestamp,json.dumps(record, cls=CustomJsonEncoder)))
-    print(json.dumps(record, cls=CustomJsonEncoder), file=jsnfile)
-    if head:
-      head = False
-      fieldnames = record.keys()
-      writer = csv.DictWriter(csvfile, fieldnames=fieldnames, quoting=csv.QUOTE_NONNUMERIC)
+    # print("{} {} {} {} {} {:0.2f} {}\n{}".format(i,luck,isBank,numCustomers,customers,deposit, timestamp,serializer().dumps(record)))
+    records.append(record)
+    if len(records) >= batch:
+      yield records
+      records = []
+  if records:
+    yield records
+
+def writeRecords(batches, csvfile, jsnfile):
+  """Sink: record dict batches to a CSV (header from the first record) and a JSON lines file."""
+  writer = None
+  for records in batches:
+    if writer is None:
+      writer = csv.DictWriter(csvfile, fieldnames=records[0].keys(), quoting=csv.QUOTE_NONNUMERIC)
       writer.writeheader()
-    writer.writerow(record)
+    writer.writerows(records)
+    jsnfile.write(serializer().lines(records))
+
+def generateDeposits(customerIDs, bankIDs, num=10, fname="deposits", mean=100, std=20, cash=0.10, zip=False, day=None):
+  if zip:
+    myOpen = compressOpen
+    myMode = "wt"
+    mySuffix = compressSuffix()
+  else:
+    myOpen = open
+    myMode = "w"
+    mySuffix = ""
+  csvfile = myOpen(fname + ".csv"  + mySuffix, myMode, newline='')
+  jsnfile = myOpen(fname + ".json" + mySuffix, myMode)
+  writeRecords(iterDepositRecords(customerIDs, bankIDs, num=num, mean=mean, std=std, cash=cash, day=day), csvfile, jsnfile)
+  csvfile.close()
+  jsnfile.close()
+  return
+
+def depositWindow(day=None):
+  # same window as the per record path: yesterday from 01:00 to 23:30
+  yesterday = datetime.today() - timedelta(days=1) if day is None else datetime.strptime(day, '%Y-%m-%d')
+  start = yesterday.replace(hour=1,  minute=0,  second=0, microsecond=0)
+  end   = yesterday.replace(hour=23, minute=30, second=0, microsecond=0)
+  return np.datetime64(start, 'us'), np.datetime64(end, 'us')
+
+def genIBANs(rng, num):
+  # same shape as fake.iban(): GB + 2 check digits + 4 letters + 14 digits
+  letters = rng.integers(0, 26, size=(num, 4), dtype=np.uint8)
+  digits  = rng.integers(0, 10, size=(num, 14), dtype=np.uint8)
+  # ISO 7064 mod 97-10 over BBAN + "GB00", letters count as two digits (A=10)
+  check = np.zeros(num, dtype=np.int64)
+  for j in range(4):
+    check = (check * 100 + letters[:, j] + 10) % 97
+  for j in range(14):
+    check = (check * 10 + digits[:, j]) % 97
+  check = (check * 1000000 + 161100) % 97   # G=16 B=11 0 0
+  check = 98 - check
+  chars = np.empty((num, 22), dtype=np.uint8)
+  chars[:, 0]     = ord('G')
+  chars[:, 1]     = ord('B')
+  chars[:, 2]     = ord('0') + check // 10
+  chars[:, 3]     = ord('0') + check % 10
+  chars[:, 4:8]   = ord('A') + letters
+  chars[:, 8:22]  = ord('0') + digits
+  return chars.view('S22').ravel().astype('U22').astype(object)
+
+def formatTimestamps(stamps):
+  # isoformat() for JSON and str() for CSV, both drop microseconds when they are zero
+  iso = np.datetime_as_string(stamps, unit='us')
+  whole = (stamps.astype(np.int64) % 1000000) == 0
+  if whole.any():
+    iso[whole] = np.datetime_as_string(stamps[whole], unit='s')
+  txt = iso.astype('S26')
+  txt.view(np.uint8).reshape(-1, 26)[:, 10] = ord(' ')
+  return iso.astype(object), txt.astype('U26').astype(object)
+
+def drawDeposits(rng, numCustomers, numBanks, num, start, end, mean=100, std=20, cash=0.10, samplers=None):
+  """Draw num deposits at once as NumPy columns.
+
+  Customers and banks are positions into the pre-indexed ID arrays, the
+  from_* positions and from_account are only meaningful where isBank.
+  samplers (a dataSamplers.DepositSamplers) replaces the uniform keys,
+  normal amounts and uniform timestamps by skewed / time varying ones.
+  """
+  isBank  = rng.random(num) > cash
+  numBank = int(isBank.sum())
+
+  if samplers is None:
+    # two distinct customers/banks per transfer, like random.sample(..., 2)
+    toCust   = rng.integers(0, numCustomers, num)
+    fromCust = rng.integers(0, numCustomers - 1, num)
+    fromCust += fromCust >= toCust
+    toBank   = rng.integers(0, numBanks, num)
+    fromBank = rng.integers(0, numBanks - 1, num)
+    fromBank += fromBank >= toBank
+
+    amount = np.round(rng.normal(mean, std, num), 2)
+    stamps = start + rng.integers(0, (end - start).astype(np.int64), num).astype('timedelta64[us]')
+  else:
+    toCust, fromCust = samplers.customers(rng, numCustomers, num)
+    toBank, fromBank = samplers.banks(rng, numBanks, num)
+    amount = samplers.amount(rng, num, mean, std)
+    stamps = samplers.stamps(rng, num, start, end)
+
+  fromAccount = np.full(num, None, dtype=object)
+  fromAccount[isBank] = genIBANs(rng, numBank)
+  toAccount = genIBANs(rng, num)
+
+  return {
+    "isBank":       isBank,
+    "stamps":       stamps,
+    "amount":       amount,
+    "toCust":       toCust,
+    "toBank":       toBank,
+    "toAccount":    toAccount,
+    "fromCust":     fromCust,
+    "fromBank":     fromBank,
+    "fromAccount":  fromAccount,
+  }
+
+def depositColumns(draw, customers, banks):
+  """Render drawn deposits as lists keyed like DEPOSIT_FIELDS.
+
+  The CSV rendering of the timestamp is added under 'timestamp_csv'.
+  """
+  isBank = draw["isBank"]
+  isoStamps, csvStamps = formatTimestamps(draw["stamps"])
+  fromCustomer = customers.take(draw["fromCust"])
+  fromBankID   = banks.take(draw["fromBank"])
+  fromCustomer[~isBank] = None
+  fromBankID[~isBank]   = None
+
+  return {
+    "timestamp":      isoStamps.tolist(),
+    "timestamp_csv":  csvStamps.tolist(),
+    "type":           np.where(isBank, "bankxfer", "cashdepo").tolist(),
+    "amount":         draw["amount"].tolist(),
+    "to_customer":    customers.take(draw["toCust"]).tolist(),
+    "to_bank":        banks.take(draw["toBank"]).tolist(),
+    "to_account":     draw["toAccount"].tolist(),
+    "from_customer":  fromCustomer.tolist(),
+    "from_bank":      fromBankID.tolist(),
+    "from_account":   draw["fromAccount"].tolist(),
+  }
+
+def genDepositBatch(rng, customers, banks, num, start, end, mean=100, std=20, cash=0.10):
+  """Draw num deposits at once from the pre-indexed customers/banks arrays.
+
+  Returns a dict of columns (lists, same keys as DEPOSIT_FIELDS) plus the
+  CSV rendering of the timestamp under 'timestamp_csv'.
+  """
+  draw = drawDeposits(rng, len(customers), len(banks), num, start, end, mean=mean, std=std, cash=cash)
+  return depositColumns(draw, customers, banks)
+
+def writeDepositBatch(writer, jsnfile, cols):
+  jsnfile.write(serializer().columns(cols, DEPOSIT_FIELDS, DEPOSIT_KINDS))
+  csvCols = [cols["timestamp_csv"]] + [cols[f] for f in DEPOSIT_FIELDS[1:]]
+  writer.writerows(zip(*csvCols))
+
+def iterDepositDraws(customers, banks, num=10, batch=100000, mean=100, std=20, cash=0.10, seed=None, day=None, samplers=None, graph=None):
+  """Yield drawDeposits() batches (positions into customers/banks, NumPy arrays).
+
+  Every batch is also added to graph (a dataGraph.GraphBuilder) when given.
+  """
+  rng = np.random.default_rng(seed)
+  start, end = depositWindow(day)
+  done = 0
+  while done < num:
+    size = min(batch, num - done)
+    draw = drawDeposits(rng, len(customers), len(banks), size, start, end, mean=mean, std=std, cash=cash, samplers=samplers)
+    if graph is not None:
+      graph.add(draw)
+    yield draw
+    done += size
+
+def iterDeposits(customerIDs, bankIDs, num=10, batch=100000, mean=100, std=20, cash=0.10, seed=None, day=None, samplers=None, graph=None):
+  """Yield deposits as column batches: dicts of lists keyed like DEPOSIT_FIELDS.
+
+  The same seed gives the same deposits as generateDepositsBatch writes,
+  so consumers (processDepositStream, sockets, tests) can take them
+  straight from memory; every batch also carries 'timestamp_csv'.
+  """
+  # index the IDs once, batches only draw integer positions into these arrays
+  customers = indexIDs(customerIDs)
+  banks     = indexIDs(bankIDs)
+  for draw in iterDepositDraws(customers, banks, num=num, batch=batch, mean=mean, std=std, cash=cash, seed=seed, day=day, samplers=samplers, graph=graph):
+    yield depositColumns(draw, customers, banks)
+
+def writeDepositStream(batches, csvfile, jsnfile):
+  """Sink: iterDeposits() batches to a CSV and a JSON lines file."""
+  writer = csv.writer(csvfile, quoting=csv.QUOTE_NONNUMERIC)
+  writer.writerow(DEPOSIT_FIELDS)
+  for cols in batches:
+    writeDepositBatch(writer, jsnfile, cols)
+
+def writeDepositLines(batches, stream):
+  """Sink: iterDeposits() batches as JSON lines to any text stream (stdout, socket.makefile('w'))."""
+  for cols in batches:
+    stream.write(serializer().columns(cols, DEPOSIT_FIELDS, DEPOSIT_KINDS))
+  stream.flush()
+
+def generateDepositsColumnar(customers, banks, num=10, fname="deposits", mean=100, std=20, cash=0.10, zip=False, batch=100000, seed=None, day=None, fmt="parquet", samplers=None, graph=None):
+  writer = DepositWriter(fname, fmt, customers, banks, zip=zip)
+  for draw in iterDepositDraws(customers, banks, num=num, batch=batch, mean=mean, std=std, cash=cash, seed=seed, day=day, samplers=samplers, graph=graph):
+    writer.write(draw)
+  writer.close()
+  return
+
+def generateDepositsBatch(customerIDs, bankIDs, num=10, fname="deposits", mean=100, std=20, cash=0.10, zip=False, batch=100000, seed=None, day=None, fmt="csv", samplers=None, graph=False):
+  # the transfer graph is collected from the draws and written last
+  builder = GraphBuilder(indexIDs(customerIDs)) if graph else None
+  if fmt != "csv":
+    generateDepositsColumnar(indexIDs(customerIDs), indexIDs(bankIDs), num=num, fname=fname, mean=mean, std=std, cash=cash, zip=zip, batch=batch, seed=seed, day=day, fmt=fmt, samplers=samplers, graph=builder)
+  else:
+    generateDepositsCSV(customerIDs, bankIDs, num=num, fname=fname, mean=mean, std=std, cash=cash, zip=zip, batch=batch, seed=seed, day=day, samplers=samplers, graph=builder)
+  if builder is not None:
+    builder.build().save(fname + GRAPH_SUFFIX)
+  return
+
+def generateDepositsCSV(customerIDs, bankIDs, num=10, fname="deposits", mean=100, std=20, cash=0.10, zip=False, batch=100000, seed=None, day=None, samplers=None, graph=None):
+  if zip:
+    myOpen = compressOpen
+    myMode = "wt"
+    mySuffix = compressSuffix()
+  else:
+    myOpen = open
+    myMode = "w"
+    mySuffix = ""
+  csvfile = myOpen(fname + ".csv"  + mySuffix, myMode, newline='')
+  jsnfile = myOpen(fname + ".json" + mySuffix, myMode)
+  writeDepositStream(iterDeposits(customerIDs, bankIDs, num=num, batch=batch, mean=mean, std=std, cash=cash, seed=seed, day=day, samplers=samplers, graph=graph), csvfile, jsnfile)
   csvfile.close()
   jsnfile.close()
   return
 
+def partName(fname, shard):
+  return "{}.part-{:04d}".format(fname, shard)
+
+def shardSizes(num, shards):
+  # near equal split, the first num % shards shards get one extra record
+  return [num // shards + (1 if i < num % shards else 0) for i in range(shards)]
+
+_shardCustomers = None
+_shardBanks     = None
+_shardSamplers  = None
+
+def initShard(customerIDs, bankIDs, encoder="auto", compression=None, samplers=None):
+  global _shardCustomers, _shardBanks, _shardSamplers
+  useSerializer(encoder)
+  if compression is not None:
+    useCompression(*compression)
+  _shardCustomers = customerIDs
+  _shardBanks     = bankIDs
+  _shardSamplers  = samplers
+
+def customerShard(task):
+  shard, customerIDs, fname, zip, seed, fmt, pooled = task
+  fake.seed_instance(seed)
+  pool = makePool(seed, *pooled) if pooled else None
+  writeCustomers(customerIDs, fname=partName(fname, shard), zip=zip, fmt=fmt, pool=pool)
+  return len(customerIDs)
+
+def depositShard(task):
+  shard, num, fname, mean, std, cash, zip, batch, seed, day, fmt, graph = task
+  generateDepositsBatch(_shardCustomers, _shardBanks, num=num, fname=partName(fname, shard), mean=mean, std=std, cash=cash, zip=zip, batch=batch, seed=seed, day=day, fmt=fmt, samplers=_shardSamplers, graph=graph)
+  return num
+
+def generateSharded(args, samplers=None, rngs=None):
+  """Generate customers and deposits in args.workers processes.
+
+  Each shard writes its own part files and draws from its own stream of
+  rngs (RNGStreams(args.seed) by default), so the same seed and worker
+  count give byte-identical output.
+  Deposits are always produced with the batched generator; samplers are
+  built once here and shared, so all shards see the same hot keys.
+  """
+  rngs = rngs or RNGStreams(args.seed)
+  # allocators pickle as a key and a count, workers format IDs on demand
+  customerIDs, bankIDs = genIDs(args, rngs)
+  batch = args.batch if args.batch > 0 else 100000
+  # every shard fills its own pools, the ssn permutation key is shared
+  pooled = (args.pool_size, args.unique, args.seed) if args.profiles == "pooled" else None
+
+  customerTasks = []
+  first = 0
+  for shard, (size, seed) in enumerate(zip(shardSizes(args.customers, args.workers), [c.seed() for c in rngs.named("customers").spawn(args.workers)])):
+    customerTasks.append((shard, customerIDs[first:first + size], args.fcustomer, args.gzip, seed, args.format, pooled))
+    first += size
+  depositTasks = [(shard, size, args.fdeposits, args.amount, args.std, args.cash, args.gzip, batch, seed, args.day, args.format, args.graph)
+                  for shard, (size, seed) in enumerate(zip(shardSizes(args.deposits, args.workers), [c.seed() for c in rngs.named("deposits").spawn(args.workers)]))]
+
+  # share the cores between the workers' compression threads
+  threads = args.compress_threads or max(1, (os.cpu_count() or 1) // args.workers)
+  compression = (args.codec, args.gzip_level, threads)
+  with multiprocessing.Pool(args.workers, initializer=initShard, initargs=(customerIDs, bankIDs, args.encoder, compression, samplers)) as pool:
+    customers = pool.map_async(customerShard, customerTasks, chunksize=1)
+    deposits  = pool.map_async(depositShard, depositTasks, chunksize=1)
+    return sum(customers.get()), sum(deposits.get())
+
 def str2bool(v):
   if isinstance(v, bool):
     return v
@@ -147,21 +478,41 @@ def str2bool(v):
 def main():
   args = getArgs()
   print(args)
+  useSerializer(args.encoder)
+  useCompression(args.codec, args.gzip_level, args.compress_threads or None)
 
   start = timer()
   start_time = datetime.now()
 
-  customerIDs = genCustomerIDs(num=args.customers)
-  bankIDs     = genBankIDs(num=args.banks)
-  writeCustomers(customerIDs, fname=args.fcustomer, zip=args.gzip)
-  generateDeposits(customerIDs, bankIDs, num=args.deposits, fname=args.fdeposits, mean=args.amount, std=args.std, cash=args.cash, zip=args.gzip)
+  rngs = RNGStreams(args.seed)
+  rngs.seedGlobals()
+  # unsharded runs use the streams of the single shard of a one worker run
+  customerSeed = rngs.named("customers").child(0).seed()
+  depositSeed  = rngs.named("deposits").child(0).seed()
+  fake.seed_instance(customerSeed)
+  # sharded runs build one pool per worker instead
+  pool = makePool(customerSeed, args.pool_size, args.unique, args.seed) if args.profiles == "pooled" and args.workers == 0 else None
+  samplers = makeSamplers(args, rngs)
+  if args.workers > 0:
+    generateSharded(args, samplers, rngs)
+  elif args.batch > 0 or args.format != "csv" or samplers is not None or args.graph:
+    # columnar output, skewed draws and graphs are only produced by the batched generator
+    customerIDs, bankIDs = genIDs(args, rngs)
+    writeCustomers(customerIDs, fname=args.fcustomer, zip=args.gzip, fmt=args.format, pool=pool)
+    generateDepositsBatch(customerIDs, bankIDs, num=args.deposits, fname=args.fdeposits, mean=args.amount, std=args.std, cash=args.cash, zip=args.gzip, batch=args.batch if args.batch > 0 else 100000, seed=depositSeed, day=args.day, fmt=args.format, samplers=samplers, graph=args.graph)
+  else:
+    customerIDs, bankIDs = genIDs(args, rngs)
+    writeCustomers(customerIDs, fname=args.fcustomer, zip=args.gzip, pool=pool)
+    generateDeposits(customerIDs, bankIDs, num=args.deposits, fname=args.fdeposits, mean=args.amount, std=args.std, cash=args.cash, zip=args.gzip, day=args.day)
 
   end = timer()
   time_elapsed = datetime.now() - start_time
+  # customers and deposits are both records, deposits usually dominate
+  numRec = args.customers + args.deposits
   print('per record Time (hh:mm:ss.ms) {}'.format(
-    timedelta(seconds=end - start) / args.customers))
+    timedelta(seconds=end - start) / numRec))
   print(
-    'Clock Time (hh:mm:ss.ms) {} for {} records'.format(time_elapsed, args.customers))
+    'Clock Time (hh:mm:ss.ms) {} for {} records ({} customers, {} deposits)'.format(time_elapsed, numRec, args.customers, args.deposits))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+"""Transfer graph of the bankxfer deposits in CSR (compressed sparse row) form.
+
+Customers are the positions of the customer IDs, the outgoing transfers
+of customer i are targets[indptr[i]:indptr[i + 1]] with their amounts in
+integer cents, so neighbours() is O(degree) and a multi-hop fan-out only
+touches the edges it follows. Graphs are saved as an uncompressed .npz
+next to the deposits; the customer IDs are kept as the allocator key
+(or as bytes for plain ID lists), so the file stays a few arrays.
+"""
+
+import json
+
+import numpy as np
+
+from dataIDs import IDAllocator
+
+GRAPH_VERSION = 1
+GRAPH_SUFFIX  = ".graph.npz"
+
+def expandRanges(starts, stops):
+  # concatenation of arange(start, stop) for every pair, without a Python loop
+  lengths = stops - starts
+  total = int(lengths.sum())
+  if not total:
+    return np.zeros(0, dtype=np.int64)
+  offsets = np.repeat(starts - np.r_[0, np.cumsum(lengths)[:-1]], lengths)
+  return offsets + np.arange(total)
+
+class TransferGraph:
+  """CSR adjacency: customer position -> (target positions, cents)."""
+  def __init__(self, indptr, targets, cents, ids=None):
+    self.indptr  = indptr
+    self.targets = targets
+    self.cents   = cents
+    self.ids     = ids
+    self.positions = None
+
+  @classmethod
+  def fromEdges(cls, numNodes, sources, targets, cents, ids=None):
+    order = np.argsort(sources, kind='stable')
+    indptr = np.zeros(numNodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=numNodes), out=indptr[1:])
+    dtype = np.int32 if numNodes < (1 << 31) else np.int64
+    return cls(indptr, targets[order].astype(dtype), cents[order], ids)
+
+  def __len__(self):
+    return len(self.indptr) - 1
+
+  def numEdges(self):
+    return len(self.targets)
+
+  def sources(self):
+    """Source position of every edge, in CSR order."""
+    return np.repeat(np.arange(len(self)), np.diff(self.indptr))
+
+  def degree(self, node=None):
+    degrees = np.diff(self.indptr)
+    return degrees if node is None else int(degrees[node])
+
+  def neighbours(self, node):
+    """(targets, cents) of the transfers sent by customer position node."""
+    first, last = self.indptr[node], self.indptr[node + 1]
+    return self.targets[first:last], self.cents[first:last]
+
+  def edges(self, nodes):
+    """Positions into targets/cents of all transfers sent by nodes."""
+    nodes = np.asarray(nodes, dtype=np.int64)
+    return expandRanges(self.indptr[nodes], self.indptr[nodes + 1])
+
+  def fanOut(self, sources, hops=2):
+    """Customers first reached after 1..hops transfers from sources.
+
+    Returns one sorted array per hop (breadth first levels); sources and
+    customers already seen are not repeated.
+    """
+    seen = np.unique(np.asarray(sources, dtype=np.int64))
+    frontier = seen
+    levels = []
+    for _ in range(hops):
+      reached = np.unique(self.targets[self.edges(frontier)])
+      frontier = np.setdiff1d(reached, seen, assume_unique=True)
+      levels.append(frontier)
+      if not len(frontier):
+        break
+      seen = np.union1d(seen, frontier)
+    return levels
+
+  def ringHops(self, node, maxHops=4):
+    """Fewest transfers (2..maxHops) leading from node back to node, None if there is no such ring."""
+    seen = np.zeros(0, dtype=np.int64)
+    frontier = np.unique(self.targets[self.edges([node])])
+    for hops in range(2, maxHops + 1):
+      seen = np.union1d(seen, frontier)
+      reached = np.unique(self.targets[self.edges(frontier)])
+      i = np.searchsorted(reached, node)
+      if i < len(reached) and reached[i] == node:
+        return hops
+      frontier = np.setdiff1d(reached, seen, assume_unique=True)
+      if not len(frontier):
+        return None
+    return None
+
+  def customerID(self, node):
+    return None if self.ids is None else self.ids[node]
+
+  def position(self, customerID):
+    """Position of a customer ID (a dict is built on first use)."""
+    if self.positions is None:
+      names = self.ids.take(np.arange(len(self))) if isinstance(self.ids, IDAllocator) else self.ids
+      self.positions = {name: i for i, name in enumerate(names.tolist())}
+    return self.positions[customerID]
+
+  def save(self, path):
+    meta = {"version": GRAPH_VERSION, "nodes": len(self)}
+    arrays = {"indptr": self.indptr, "targets": self.targets, "cents": self.cents}
+    if isinstance(self.ids, IDAllocator):
+      meta["allocator"] = {"num": self.ids.num, "start": self.ids.start, "prefix": self.ids.prefix}
+      arrays["keys"] = self.ids.keys
+    elif self.ids is not None:
+      arrays["ids"] = np.array([i.encode() for i in self.ids], dtype=bytes)
+    with open(path, "wb") as f:
+      np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+
+def loadGraph(*paths):
+  """Load one graph file, or merge the part files of a sharded run."""
+  graphs = []
+  for path in paths:
+    with np.load(path) as data:
+      meta = json.loads(str(data['meta']))
+      if meta.get("version") != GRAPH_VERSION:
+        raise ValueError('{}: unsupported graph version {}'.format(path, meta.get("version")))
+      ids = None
+      if "allocator" in meta:
+        a = meta["allocator"]
+        ids = IDAllocator(a["num"], prefix=a["prefix"], start=a["start"], keys=data['keys'])
+      elif "ids" in data:
+        ids = np.array([i.decode() for i in data['ids']], dtype=object)
+      graphs.append(TransferGraph(data['indptr'], data['targets'], data['cents'], ids))
+  if len(graphs) == 1:
+    return graphs[0]
+  if len({len(g) for g in graphs}) != 1:
+    raise ValueError('graph parts have different numbers of customers')
+  # shards share the customer positions, only the edges need merging
+  return TransferGraph.fromEdges(len(graphs[0]), np.concatenate([g.sources() for g in graphs]),
+                                 np.concatenate([g.targets for g in graphs]), np.concatenate([g.cents for g in graphs]), graphs[0].ids)
+
+class GraphBuilder:
+  """Collects the bankxfer edges of drawDeposits() batches."""
+  def __init__(self, customers):
+    self.customers = customers
+    self.parts = []
+
+  def add(self, draw):
+    isBank = draw["isBank"]
+    cents = np.rint(draw["amount"][isBank] * 100).astype(np.int64)
+    self.parts.append((draw["fromCust"][isBank], draw["toCust"][isBank], cents))
+
+  def build(self):
+    if self.parts:
+      sources, targets, cents = [np.concatenate(c) for c in zip(*self.parts)]
+    else:
+      sources, targets, cents = (np.zeros(0, dtype=np.int64) for _ in range(3))
+    return TransferGraph.fromEdges(len(self.customers), sources, targets, cents, self.customers)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+"""Group-by aggregation of deposits: count, total, min and max cents per key.
+
+Keys are integer encoded before any aggregation: hours of the day index a
+dense table updated with bincount, string keys (banks, customers) are
+64-bit hashes that are sorted once per block and reduced with reduceat.
+High cardinality keys can be hash partitioned and spilled to disk block
+by block, so memory holds one block plus the partition being finalized.
+"""
+
+import os, shutil, tempfile
+
+import numpy as np
+
+from dataSketch import hash64
+
+GROUP_KEYS = ["to_bank", "to_customer", "hour"]
+COMPACT    = 1 << 22
+
+def reduceSorted(codes, keys, count, total, lo, hi):
+  # partials sorted by code -> one row per code
+  starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+  return (codes[starts], keys[starts], np.add.reduceat(count, starts), np.add.reduceat(total, starts),
+          np.minimum.reduceat(lo, starts), np.maximum.reduceat(hi, starts))
+
+def reducePartials(parts):
+  """Merge (codes, keys, count, total, min, max) partials into one."""
+  codes, keys, count, total, lo, hi = [np.concatenate(c) for c in zip(*parts)]
+  order = np.argsort(codes, kind='stable')
+  return reduceSorted(codes[order], keys[order], count[order], total[order], lo[order], hi[order])
+
+def hourKeys(stamps):
+  """Hour of day of CSV ("2020-01-01 13:...", quoted) or ISO timestamps."""
+  chars = np.array(stamps, dtype=bytes)
+  chars = chars.view(np.uint8).reshape(len(chars), chars.dtype.itemsize)
+  skip = 1 if len(chars) and chars[0, 0] == ord('"') else 0
+  return (chars[:, 11 + skip].astype(np.intp) - 48) * 10 + chars[:, 12 + skip] - 48
+
+class DenseGroups:
+  """Groups over small integer keys 0..size-1, e.g. hours of the day."""
+  def __init__(self, size=24):
+    self.count = np.zeros(size, dtype=np.int64)
+    self.total = np.zeros(size, dtype=np.int64)
+    self.lo    = np.full(size, np.iinfo(np.int64).max)
+    self.hi    = np.full(size, np.iinfo(np.int64).min)
+
+  def add(self, codes, cents):
+    size = len(self.count)
+    self.count += np.bincount(codes, minlength=size)
+    # float weights are exact while a block sums to less than 2**53 cents
+    self.total += np.rint(np.bincount(codes, weights=cents, minlength=size)).astype(np.int64)
+    np.minimum.at(self.lo, codes, cents)
+    np.maximum.at(self.hi, codes, cents)
+
+  def rows(self):
+    for key in np.flatnonzero(self.count):
+      yield key, self.count[key], self.total[key], self.lo[key], self.hi[key]
+
+class HashGroups:
+  """Groups over string keys, in memory or spilled to partitions on disk.
+
+  With partitions > 0 every block is aggregated, split by hash into that
+  many partitions and appended to one spill file each; rows() then merges
+  one partition at a time. In memory, partials are merged whenever they
+  hold more than COMPACT rows.
+  """
+  def __init__(self, partitions=0, spillDir=None):
+    self.partitions = partitions
+    self.parts = []
+    self.rowsHeld = 0
+    self.spillDir = None
+    if partitions > 0:
+      self.spillDir = tempfile.mkdtemp(prefix="groups-", dir=spillDir)
+      self.files = [open(os.path.join(self.spillDir, "part-{:04d}.npy".format(p)), "w+b") for p in range(partitions)]
+
+  def add(self, keys, cents):
+    if not len(keys):
+      return
+    keys = np.array(keys, dtype=bytes)
+    codes = hash64(keys)
+    one = np.ones(len(cents), dtype=np.int64)
+    partial = reducePartials([(codes, keys, one, cents, cents, cents)])
+    if self.partitions > 0:
+      self.spill(partial)
+      return
+    self.parts.append(partial)
+    self.rowsHeld += len(partial[0])
+    if self.rowsHeld > COMPACT and len(self.parts) > 1:
+      self.parts = [reducePartials(self.parts)]
+      self.rowsHeld = len(self.parts[0][0])
+
+  def spill(self, partial):
+    which = partial[0] % np.uint64(self.partitions)
+    for p, f in enumerate(self.files):
+      keep = which == p
+      if keep.any():
+        for column in partial:
+          np.save(f, column[keep])
+
+  def partitionParts(self, p):
+    f = self.files[p]
+    end = f.tell()
+    f.seek(0)
+    parts = []
+    while f.tell() < end:
+      parts.append(tuple(np.load(f) for _ in range(6)))
+    return parts
+
+  def rows(self):
+    """(key, count, total, min, max) rows, sorted by key within a partition."""
+    if self.partitions > 0:
+      sources = (self.partitionParts(p) for p in range(self.partitions))
+    else:
+      sources = [self.parts]
+    for parts in sources:
+      if not parts:
+        continue
+      codes, keys, count, total, lo, hi = reducePartials(parts)
+      order = np.argsort(keys, kind='stable')
+      for i in order.tolist():
+        yield keys[i].decode().strip('"'), count[i], total[i], lo[i], hi[i]
+
+  def close(self):
+    if self.spillDir is not None:
+      for f in self.files:
+        f.close()
+      shutil.rmtree(self.spillDir, ignore_errors=True)
+      self.spillDir = None
+
+def centsText(cents):
+  sign = '-' if cents < 0 else ''
+  return '{}{}.{:02d}'.format(sign, abs(int(cents)) // 100, abs(int(cents)) % 100)
+
+def writeGroups(path, name, rows):
+  """Write group rows as CSV (key, count, total, min, max); returns the number of groups."""
+  num = 0
+  with open(path, "w") as f:
+    f.write('"{}","count","total","min","max"\n'.format(name))
+    for key, count, total, lo, hi in rows:
+      key = '"{}"'.format(key) if isinstance(key, str) else int(key)
+      f.write('{},{},{},{},{}\n'.format(key, int(count), centsText(total), centsText(lo), centsText(hi)))
+      num += 1
+  return num
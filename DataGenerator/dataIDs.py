@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+"""Compact, lazily formatted customer/bank IDs.
+
+An IDAllocator holds no per ID state: ID i is the counter i put through a
+keyed Feistel permutation of the 122 random bits of a version 4 UUID, so
+IDs are unique by construction and look like str(uuid.uuid4()). Strings
+are only built for the positions asked for, in vectorized batches.
+"""
+
+import collections.abc, os
+
+import numpy as np
+
+MASK61  = np.uint64((1 << 61) - 1)
+ROUNDS  = 6
+HEX     = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+SHIFTS  = np.arange(60, -4, -4).astype(np.uint64)
+
+def mix61(x, key):
+  # splitmix64 finalizer keyed by xor, truncated to one 61-bit Feistel half
+  x = x ^ key
+  x = x * np.uint64(0x9E3779B97F4A7C15)
+  x = x ^ (x >> np.uint64(29))
+  x = x * np.uint64(0xBF58476D1CE4E5B9)
+  x = x ^ (x >> np.uint64(32))
+  return x & MASK61
+
+def hexChars(words):
+  # (n,) uint64 -> (n, 16) ASCII hex digits, most significant first
+  return HEX[(words[:, None] >> SHIFTS) & np.uint64(15)]
+
+class IDAllocator(collections.abc.Sequence):
+  """num IDs (optionally prefixed) drawn from a keyed bijective permutation.
+
+  Supports len(), indexing, slicing (a view on the same permutation),
+  iteration and random.sample(); take(indices) formats many IDs at once.
+  The same seed always gives the same IDs, seed=None draws a fresh key.
+  """
+  def __init__(self, num, seed=None, prefix="", start=0, keys=None):
+    if keys is None:
+      entropy = int.from_bytes(os.urandom(16), 'little') if seed is None else seed
+      keys = np.random.SeedSequence(entropy).generate_state(ROUNDS, np.uint64)
+    if num + start > (1 << 61):
+      raise ValueError('at most 2**61 IDs per allocator')
+    self.keys   = keys
+    self.num    = num
+    self.start  = start
+    self.prefix = prefix
+
+  def __len__(self):
+    return self.num
+
+  def __getitem__(self, i):
+    if isinstance(i, slice):
+      first, last, step = i.indices(self.num)
+      if step != 1:
+        return self.take(np.arange(first, last, step)).tolist()
+      return IDAllocator(max(last - first, 0), prefix=self.prefix, start=self.start + first, keys=self.keys)
+    if i < 0:
+      i += self.num
+    if not 0 <= i < self.num:
+      raise IndexError('ID index out of range')
+    return self.take(np.array([i]))[0]
+
+  def __iter__(self, batch=65536):
+    for first in range(0, self.num, batch):
+      yield from self.take(np.arange(first, min(first + batch, self.num))).tolist()
+
+  def words(self, indices):
+    """The two 64-bit words of the UUIDs at the given positions."""
+    left  = np.zeros(len(indices), dtype=np.uint64)
+    right = np.asarray(indices, dtype=np.uint64) + np.uint64(self.start)
+    for key in self.keys:
+      left, right = right, left ^ mix61(right, key)
+    # 122 permuted bits around the version (4) and variant (10) fields
+    high = left >> np.uint64(1)
+    low  = ((left & np.uint64(1)) << np.uint64(61)) | right
+    high = ((high >> np.uint64(12)) << np.uint64(16)) | np.uint64(0x4000) | (high & np.uint64(0xFFF))
+    low  = np.uint64(1 << 63) | low
+    return high, low
+
+  def width(self):
+    return len(self.prefix) + 36
+
+  def chars(self, indices):
+    """(len(indices), width()) uint8 matrix of the ASCII IDs at the given positions."""
+    high, low = self.words(np.asarray(indices).ravel())
+    size = self.width()
+    chars = np.empty((len(high), size), dtype=np.uint8)
+    chars[:, :len(self.prefix)] = np.frombuffer(self.prefix.encode(), dtype=np.uint8)
+    out = chars[:, len(self.prefix):]
+    hi, lo = hexChars(high), hexChars(low)
+    out[:, 0:8]   = hi[:, 0:8]
+    out[:, 9:13]  = hi[:, 8:12]
+    out[:, 14:18] = hi[:, 12:16]
+    out[:, 19:23] = lo[:, 0:4]
+    out[:, 24:36] = lo[:, 4:16]
+    out[:, [8, 13, 18, 23]] = ord('-')
+    return chars
+
+  def take(self, indices):
+    """Object array of ID strings for the given positions."""
+    indices = np.asarray(indices)
+    size = self.width()
+    ids = self.chars(indices).view('S{}'.format(size)).ravel().astype('U{}'.format(size)).astype(object)
+    return ids.reshape(indices.shape)
+
+  def sample(self, rng, k):
+    """k distinct IDs picked at random, like random.sample(ids, k)."""
+    return self.take(rng.choice(self.num, size=k, replace=False))
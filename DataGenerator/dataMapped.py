@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+"""Memory-mapped, vectorized reader for uncompressed deposits CSV files.
+
+The file is mapped read only and viewed as a uint8 array; record and
+field boundaries come from one vectorized scan for newlines and commas
+per block (deposit fields never hold either), so no per row Python
+objects are built. Fields are exposed as (start, end) offsets into the
+block view, amounts are parsed from the bytes straight into integer cents
+and other columns are gathered into fixed width byte arrays on demand.
+"""
+
+import mmap
+
+import numpy as np
+
+COLUMNS = 9
+HEADER  = b'"timestamp"'
+
+class MappedBlock:
+  """Complete lines of a mapped file: the bytes (a view) and field offsets."""
+  def __init__(self, view):
+    self.view = view
+    ends = np.flatnonzero(view == 10)
+    commas = np.flatnonzero(view == 44)
+    if len(commas) != len(ends) * (COLUMNS - 1):
+      raise ValueError('not a plain deposits block: {} lines, {} commas'.format(len(ends), len(commas)))
+    commas = commas.reshape(len(ends), COLUMNS - 1)
+    self.starts = np.empty((len(ends), COLUMNS), dtype=np.int64)
+    self.stops  = np.empty((len(ends), COLUMNS), dtype=np.int64)
+    self.starts[:, 0]  = np.r_[0, ends[:-1] + 1]
+    self.starts[:, 1:] = commas + 1
+    self.stops[:, :-1] = commas
+    self.stops[:, -1]  = ends
+    if len(ends) and view[:len(HEADER)].tobytes() == HEADER:
+      self.starts, self.stops = self.starts[1:], self.stops[1:]
+
+  def __len__(self):
+    return len(self.starts)
+
+  def chars(self, col, width=None):
+    """(rows, width) matrix of the bytes of a column, zero padded."""
+    start, stop = self.starts[:, col], self.stops[:, col]
+    length = stop - start
+    if width is None:
+      width = int(length.max()) if len(start) else 0
+    if not len(start) or not width:
+      return np.zeros((len(start), width), dtype=np.uint8)
+    # gather whole rows out of a strided window view (one memcpy per row),
+    # rows too close to the end of the block are patched one by one
+    view = self.view if len(self.view) >= width else np.append(self.view, np.zeros(width, dtype=np.uint8))
+    step = view.strides[0]
+    windows = np.lib.stride_tricks.as_strided(view, shape=(len(view) - width + 1, width), strides=(step, step), writeable=False)
+    safe = np.minimum(start, len(view) - width)
+    chars = windows[safe]
+    for i in np.flatnonzero(safe != start).tolist():
+      chars[i] = 0
+      chars[i, :length[i]] = view[start[i]:stop[i]][:width]
+    if (length < width).any():
+      chars[np.arange(width)[None, :] >= length[:, None]] = 0
+    return chars
+
+  def column(self, col):
+    """Fixed width bytes array of a column (quotes included, empty for nulls)."""
+    chars = self.chars(col)
+    return np.ascontiguousarray(chars).view('S{}'.format(max(chars.shape[1], 1))).ravel() if chars.shape[1] else np.zeros(len(self), dtype='S1')
+
+  def cents(self, col=2):
+    """Integer cents of a decimal column, parsed digit by digit from the bytes.
+
+    Values with more than 2 decimals, exponents or other odd characters
+    fall back to float parsing (rounded to cents) for those rows only.
+    """
+    chars = self.chars(col)
+    rows, width = chars.shape
+    length = self.stops[:, col] - self.starts[:, col]
+    pos = np.arange(width)[None, :]
+    isDot = chars == ord('.')
+    dot = np.where(isDot.any(axis=1), isDot.argmax(axis=1), length)[:, None]
+    isDigit = (chars >= 48) & (chars <= 57)
+    # power of ten (in cents) of each digit, relative to the decimal point
+    power = dot - pos + 2 - (pos < dot)
+    cents = np.where(isDigit & (power >= 0), (chars - 48).astype(np.int64) * 10 ** np.maximum(power, 0), 0).sum(axis=1)
+    negative = chars[:, 0] == ord('-')
+    cents = np.where(negative, -cents, cents)
+    inField = pos < length[:, None]
+    plain = isDigit | isDot | ((pos == 0) & negative[:, None])
+    odd = ((inField & ~plain).any(axis=1) | (isDigit & (power < 0)).any(axis=1)
+           | (isDot.sum(axis=1) > 1) | (length == 0))
+    for i in np.flatnonzero(odd).tolist():
+      text = chars[i, :length[i]].tobytes()
+      cents[i] = int(round(float(text) * 100)) if text else 0
+    return cents
+
+class MappedDeposits:
+  """Read only memory map of a deposits CSV cut into MappedBlocks.
+
+  blocks(start, end) covers the lines starting in [start, end), so
+  byte ranges of one file can be handed to different processes.
+  """
+  def __init__(self, path):
+    self.file = open(path, 'rb')
+    self.size = self.file.seek(0, 2)
+    self.map  = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+    self.data = np.frombuffer(self.map, dtype=np.uint8) if self.size else np.zeros(0, dtype=np.uint8)
+
+  def lineStart(self, pos):
+    # first line starting at or after pos
+    if pos <= 0:
+      return 0
+    if pos >= self.size:
+      return self.size
+    nl = self.map.find(b'\n', pos - 1)
+    return self.size if nl < 0 else nl + 1
+
+  def blocks(self, start=0, end=None, blockSize=64 << 20):
+    end = self.lineStart(self.size if end is None else end)
+    pos = self.lineStart(start)
+    while pos < end:
+      stop = self.lineStart(min(pos + blockSize, end))
+      if stop == pos:
+        stop = end
+      view = self.data[pos:stop]
+      if view[-1] != 10:
+        # last line without a newline: copy it out with one appended
+        view = np.append(view, np.uint8(10))
+      yield MappedBlock(view)
+      pos = stop
+
+  def close(self):
+    self.data = None
+    if self.map is not None:
+      self.map.close()
+    self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
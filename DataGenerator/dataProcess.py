@@ -1,78 +1,535 @@
 #!/usr/bin/env python3
 
-import random, csv, json, argparse, uuid, os, gzip
+import random, csv, json, argparse, uuid, os, gzip, glob, itertools, multiprocessing
+
+import numpy as np
+
+from dataSerialize import serializer
+from dataCompress import CODECS, compressSuffix, decompressOpen, openReader, useCompression
+from dataFormats import FORMATS, depositBatches, depositArrays
+from dataSketch import HyperLogLog, MIN_PRECISION, MAX_PRECISION
+from dataGroup import GROUP_KEYS, DenseGroups, HashGroups, hourKeys, writeGroups
+from dataMapped import MappedDeposits
 
 from decimal import *
-from bloom_filter import BloomFilter
 from decimal import Decimal
 from timeit import default_timer as timer
 from datetime import timedelta, datetime, date
 
 # getcontext().prec = 2
 
+DEPOSIT_COLUMNS = 9
 
-class CustomJsonEncoder(json.JSONEncoder):
-  def default(self, obj):
-    if isinstance(obj, Decimal):
-      return float(obj)
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    return super(CustomJsonEncoder, self).default(obj)
 
 def getArgs():
   parser = argparse.ArgumentParser(description='Process test data.')
   parser.add_argument('-fc', '--fcustomer', type=str, default="customer", help='filename (no extension)')
   parser.add_argument('-fd', '--fdeposits', type=str, default="deposits", help='filename (no extension)')
   parser.add_argument('-z',  '--gzip',      type=str2bool, nargs='?',const=True, default=False,help='Activate gzip.')
+  parser.add_argument('--codec',            type=str, default="gzip", choices=CODECS, help='compression of -z files')
+  parser.add_argument('--compress-threads', type=int, default=0, help='decompression threads per file (0 = all cores)')
+  parser.add_argument('-f',  '--format',    type=str, default="csv", choices=FORMATS, help='deposits written as csv or a columnar file')
+  parser.add_argument('-e',  '--engine',    type=str, default="decimal", choices=["decimal", "chunked", "mmap"], help='row by row Decimal sums, chunked integer cents or memory-mapped vectorized scan (uncompressed)')
+  parser.add_argument('-w',  '--workers',   type=int, default=0, help='processes for the chunked engine (0 = in process)')
+  parser.add_argument('--block',            type=int, default=16, help='chunked engine read size in MB')
+  parser.add_argument('--validate',         type=str2bool, nargs='?',const=True, default=False,help='Run both engines and compare totals.')
+  parser.add_argument('--approx-distinct',  type=str2bool, nargs='?',const=True, default=False,help='Count unique IDs with HyperLogLog sketches instead of sets.')
+  parser.add_argument('--hll-precision',    type=int, default=14, help='HyperLogLog precision, 2**p registers (4-18)')
+  parser.add_argument('-g',  '--group-by',  type=str, default=None, help='comma separated group keys: ' + ",".join(GROUP_KEYS))
+  parser.add_argument('--group-source',     type=str, default="csv", choices=["csv", "json"], help='deposits file the group-by engine reads')
+  parser.add_argument('--partitions',       type=int, default=0, help='spill string group keys to this many partitions on disk (0 = in memory)')
+  parser.add_argument('--spill-dir',        type=str, default=None, help='directory for the spilled partitions (default temp)')
+  parser.add_argument('--checkpoint',       type=str, default=None, help='incremental mode: resume from / save to this checkpoint (.npz)')
   args = parser.parse_args()
+  if not MIN_PRECISION <= args.hll_precision <= MAX_PRECISION:
+    parser.error('--hll-precision must be between {} and {}'.format(MIN_PRECISION, MAX_PRECISION))
+  if args.engine == "mmap" and args.gzip:
+    parser.error('--engine mmap reads uncompressed files only')
+  if args.group_by:
+    args.group_by = [k for k in args.group_by.split(",") if k]
+    for k in args.group_by:
+      if k not in GROUP_KEYS:
+        parser.error('--group-by: {} is not one of {}'.format(k, ",".join(GROUP_KEYS)))
   return args
 
-def processDeposits(fname="deposits", zip=False):
+def processDeposits(fname="deposits", zip=False, totals=None):
   if zip:
-    myOpen = gzip.open
+    myOpen = decompressOpen
     myMode = "rt"
-    mySuffix = ".gz"
   else:
     myOpen = open
     myMode = "r"
-    mySuffix = ""
 
   numRecords = 0
   numBank = 0
   numCash = 0
-  to_customers = set()
-  to_banks = set()
-  from_customers = set()
-  from_banks = set()
-
-  csvfile = myOpen(fname + ".csv"  + mySuffix, myMode, newline='')
-  jsnfile = myOpen(fname + ".json" + mySuffix, myMode)
+  to_customers = distinctSet()
+  to_banks = distinctSet()
+  from_customers = distinctSet()
+  from_banks = distinctSet()
 
   bankDeposit = Decimal('0.00')
   cashDeposit = Decimal('0.00')
   totDeposits = Decimal('0.00')
-  reader = csv.DictReader(csvfile, quoting=csv.QUOTE_NONNUMERIC)
-  for row in reader:
-    amt = Decimal(row['amount'])
-    numRecords  += 1
-    totDeposits += amt
-    to_customers.add(row['to_customer'])
-    to_banks.add(row['to_bank'])
-    if row['type'] == 'bankxfer':
-      bankDeposit = bankDeposit + amt
-      numBank  += 1
-      from_customers.add(row['from_customer'])
-      from_banks.add(row['from_bank'])
-    if row['type'] == 'cashdepo':
-      cashDeposit = cashDeposit + amt
-      numCash  += 1
-    if numRecords % 50000 == 0:
-      print('>>>>> {:10,d} {:20,.2f} {:10,d} {:20,.2f} {:10,d} {:20,.2f}'.format(numRecords,totDeposits,numBank,bankDeposit,numCash,cashDeposit))
-
-  csvfile.close()
-  jsnfile.close()
+  # one file, or the part files of a sharded run
+  for path in depositFiles(fname, zip):
+    csvfile = myOpen(path, myMode, newline='')
+    reader = csv.DictReader(csvfile, quoting=csv.QUOTE_NONNUMERIC)
+    for row in reader:
+      amt = Decimal(row['amount'])
+      numRecords  += 1
+      totDeposits += amt
+      to_customers.add(row['to_customer'])
+      to_banks.add(row['to_bank'])
+      if row['type'] == 'bankxfer':
+        bankDeposit = bankDeposit + amt
+        numBank  += 1
+        from_customers.add(row['from_customer'])
+        from_banks.add(row['from_bank'])
+      if row['type'] == 'cashdepo':
+        cashDeposit = cashDeposit + amt
+        numCash  += 1
+      if numRecords % 50000 == 0:
+        print('>>>>> {:10,d} {:20,.2f} {:10,d} {:20,.2f} {:10,d} {:20,.2f}'.format(numRecords,totDeposits,numBank,bankDeposit,numCash,cashDeposit))
+    csvfile.close()
+
   print('##### {:10,d} {:20,.2f} {:10,d} {:20,.2f} {:10,d} {:20,.2f}'.format(numRecords,totDeposits,numBank,bankDeposit,numCash,cashDeposit))
   print('##### unique TO customers {:10,d} banks {:10,d} FROM customers {:10,d} banks {:10,d} '.format(len(to_customers),len(to_banks),len(from_customers),len(from_banks)))
+  if totals is not None:
+    # hand the Decimal results over as cents so --validate can compare engines
+    totals.numRecords, totals.numBank, totals.numCash = numRecords, numBank, numCash
+    totals.totCents  = toCents(totDeposits)
+    totals.bankCents = toCents(bankDeposit)
+    totals.cashCents = toCents(cashDeposit)
+    totals.to_customers, totals.to_banks = to_customers, to_banks
+    totals.from_customers, totals.from_banks = from_customers, from_banks
+  return numRecords
+
+_distinct = {"precision": None}
+
+def useApproxDistinct(precision=None):
+  # None keeps exact sets, an int swaps them for HyperLogLog sketches;
+  # building one up front checks the precision for library callers
+  if precision is not None:
+    HyperLogLog(precision)
+  _distinct["precision"] = precision
+
+def distinctSet():
+  if _distinct["precision"] is None:
+    return set()
+  return HyperLogLog(_distinct["precision"])
+
+def toCents(amount):
+  return int(amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_EVEN).scaleb(2))
+
+class DepositTotals:
+  """Partial aggregation of deposits, amounts in integer cents.
+
+  Partials from different blocks, byte ranges or part files are combined
+  with merge(), so the result does not depend on how the input was split.
+  """
+  def __init__(self):
+    self.numRecords = 0
+    self.numBank = 0
+    self.numCash = 0
+    self.totCents = 0
+    self.bankCents = 0
+    self.cashCents = 0
+    self.to_customers = distinctSet()
+    self.to_banks = distinctSet()
+    self.from_customers = distinctSet()
+    self.from_banks = distinctSet()
+
+  def add(self, cols):
+    """Aggregate one block given as a list of byte field columns."""
+    if not cols or not cols[0]:
+      return
+    types = np.array(cols[1])
+    isBank = types == b'"bankxfer"'
+    isCash = types == b'"cashdepo"'
+    # amounts were written as round(x, 2) floats, so rint(x * 100) is exact
+    cents = np.rint(np.array(cols[2]).astype(np.float64) * 100).astype(np.int64)
+    bank = isBank.tolist()
+    self.addArrays(isBank, isCash, cents, cols[3], cols[4], itertools.compress(cols[6], bank), itertools.compress(cols[7], bank))
+
+  def addColumns(self, cols):
+    """Aggregate one in-memory column batch, as yielded by dataGenerate.iterDeposits()."""
+    types = np.array(cols["type"])
+    isBank = types == "bankxfer"
+    isCash = types == "cashdepo"
+    cents = np.rint(np.array(cols["amount"], dtype=np.float64) * 100).astype(np.int64)
+    bank = isBank.tolist()
+    self.addArrays(isBank, isCash, cents, cols["to_customer"], cols["to_bank"], itertools.compress(cols["from_customer"], bank), itertools.compress(cols["from_bank"], bank))
+
+  def addArrays(self, isBank, isCash, cents, toCustomers, toBanks, fromCustomers, fromBanks):
+    """Aggregate one block of flags and cents plus the IDs it referenced."""
+    self.numRecords += len(cents)
+    self.numBank    += int(isBank.sum())
+    self.numCash    += int(isCash.sum())
+    self.totCents   += int(cents.sum())
+    self.bankCents  += int(cents[isBank].sum())
+    self.cashCents  += int(cents[isCash].sum())
+    self.to_customers.update(toCustomers)
+    self.to_banks.update(toBanks)
+    self.from_customers.update(fromCustomers)
+    self.from_banks.update(fromBanks)
+
+  def merge(self, other):
+    self.numRecords += other.numRecords
+    self.numBank    += other.numBank
+    self.numCash    += other.numCash
+    self.totCents   += other.totCents
+    self.bankCents  += other.bankCents
+    self.cashCents  += other.cashCents
+    self.to_customers   |= other.to_customers
+    self.to_banks       |= other.to_banks
+    self.from_customers |= other.from_customers
+    self.from_banks     |= other.from_banks
+    return self
+
+  def summary(self):
+    return (self.numRecords, self.totCents, self.numBank, self.bankCents, self.numCash, self.cashCents,
+            len(self.to_customers), len(self.to_banks), len(self.from_customers), len(self.from_banks))
+
+  def amounts(self):
+    return [Decimal(c).scaleb(-2) for c in (self.totCents, self.bankCents, self.cashCents)]
+
+  def report(self, tag='#####'):
+    tot, bank, cash = self.amounts()
+    print('{} {:10,d} {:20,.2f} {:10,d} {:20,.2f} {:10,d} {:20,.2f}'.format(tag,self.numRecords,tot,self.numBank,bank,self.numCash,cash))
+    print('{} unique TO customers {:10,d} banks {:10,d} FROM customers {:10,d} banks {:10,d} '.format(tag,len(self.to_customers),len(self.to_banks),len(self.from_customers),len(self.from_banks)))
+
+def splitColumns(data):
+  """Split complete CSV lines into DEPOSIT_COLUMNS columns of undecoded bytes.
+
+  Deposit fields never hold commas or newlines, so one split of the whole
+  block on both gives the fields row after row.
+  """
+  if data.startswith(b'"timestamp"'):
+    data = data[data.find(b'\n') + 1:]
+  fields = data.replace(b'\n', b',').split(b',')
+  if fields[-1] == b'':
+    fields.pop()
+  if len(fields) % DEPOSIT_COLUMNS:
+    # blank or odd lines, fall back to splitting line by line
+    rows = [l.split(b',', DEPOSIT_COLUMNS - 1) for l in data.split(b'\n') if len(l) > 1]
+    return [list(c) for c in zip(*rows)]
+  return [fields[i::DEPOSIT_COLUMNS] for i in range(DEPOSIT_COLUMNS)]
+
+def depositBlocks(path, start=0, end=None, blockSize=16 << 20):
+  """Yield the lines starting in [start, end) of one deposits file as splitColumns() blocks.
+
+  end=None reads to the end of file; compressed files are read from start
+  (a compressed offset) to their end.
+  """
+  compressed = path.endswith(('.gz', '.zst'))
+  if compressed:
+    # start is a compressed offset here, on a member / frame boundary
+    f = openReader(path, offset=start)
+  else:
+    f = open(path, 'rb')
+  with f:
+    if start > 0 and not compressed:
+      # the line straddling start belongs to the previous range
+      f.seek(start - 1)
+      f.readline()
+    pos = f.tell() if end is not None else 0
+    rest = b''
+    while end is None or pos < end:
+      block = f.read(blockSize if end is None else min(blockSize, end - pos))
+      if not block:
+        break
+      pos += len(block)
+      if end is not None and pos >= end and not block.endswith(b'\n'):
+        block += f.readline()
+      data = rest + block
+      cut = data.rfind(b'\n') + 1
+      rest = data[cut:]
+      yield splitColumns(data[:cut])
+    yield splitColumns(rest)
+
+def scanRange(task):
+  """Aggregate the lines starting in [start, end) of one deposits file."""
+  path, start, end, blockSize = task
+  totals = DepositTotals()
+  for cols in depositBlocks(path, start, end, blockSize):
+    totals.add(cols)
+  return totals
+
+def depositFiles(fname="deposits", zip=False, fmt="csv"):
+  if fmt in ("csv", "json"):
+    suffix = "." + fmt + (compressSuffix() if zip else "")
+  else:
+    suffix = "." + fmt
+  parts = sorted(glob.glob(glob.escape(fname) + ".part-[0-9][0-9][0-9][0-9]" + suffix))
+  return parts if parts else [fname + suffix]
+
+def scanColumnar(path):
+  totals = DepositTotals()
+  for batch in depositBatches(path, ["type", "amount", "to_customer", "to_bank", "from_customer", "from_bank"]):
+    totals.addArrays(*depositArrays(batch))
+  return totals
+
+def scanTasks(scan, tasks, workers=0):
+  """Run scan over tasks, in workers processes when there is more than one, and merge."""
+  totals = DepositTotals()
+  if workers > 1 and len(tasks) > 1:
+    with multiprocessing.Pool(workers, initializer=useApproxDistinct, initargs=(_distinct["precision"],)) as pool:
+      for partial in pool.imap(scan, tasks):
+        totals.merge(partial)
+  else:
+    for task in tasks:
+      totals.merge(scan(task))
+  return totals
+
+def processDepositsColumnar(fname="deposits", fmt="parquet", workers=0):
+  """Aggregate deposits from Parquet/Arrow files (or their part files).
+
+  Only the six needed columns are read, amounts come straight from the
+  decimal128 column as integer cents and IDs off the dictionaries.
+  """
+  totals = scanTasks(scanColumnar, depositFiles(fname, fmt=fmt), workers)
+  totals.report()
+  return totals
+
+def processDepositStream(batches):
+  """Aggregate deposits column batches straight from a generator, no file involved."""
+  totals = DepositTotals()
+  for cols in batches:
+    totals.addColumns(cols)
+  totals.report()
+  return totals
+
+def rangeTasks(path, start, end, workers=0, blockSize=16 << 20):
+  # [start, end) of an uncompressed file cut in up to workers line aligned ranges
+  if workers <= 1 or end - start <= blockSize:
+    return [(path, start, end, blockSize)]
+  step = -(-(end - start) // workers)
+  return [(path, first, min(first + step, end), blockSize) for first in range(start, end, step)]
+
+def processDepositsChunked(fname="deposits", zip=False, workers=0, blockSize=16 << 20):
+  """Aggregate deposits (or their part files) in blocks of integer cents.
+
+  Uncompressed files are cut into byte ranges aligned on line ends so that
+  workers processes can share a single file; compressed files go one per task.
+  Totals match the Decimal path of processDeposits rounded to cents.
+  """
+  tasks = []
+  for path in depositFiles(fname, zip):
+    size = os.path.getsize(path)
+    if zip or workers <= 1 or size <= blockSize:
+      tasks.append((path, 0, None, blockSize))
+    else:
+      tasks.extend(rangeTasks(path, 0, size, workers, blockSize))
+  totals = scanTasks(scanRange, tasks, workers)
+  totals.report()
+  return totals
+
+CHECKPOINT_VERSION = 1
+COUNTERS = ["numRecords", "numBank", "numCash", "totCents", "bankCents", "cashCents"]
+ID_SETS  = ["to_customers", "to_banks", "from_customers", "from_banks"]
+
+def scanMapped(task):
+  """Aggregate the lines starting in [start, end) of a memory-mapped deposits file."""
+  path, start, end, blockSize = task
+  totals = DepositTotals()
+  with MappedDeposits(path) as deposits:
+    for block in deposits.blocks(start, end, blockSize):
+      if not len(block):
+        continue
+      # the letter after the opening quote tells "bankxfer" from "cashdepo"
+      kind = block.chars(1, 2)[:, 1]
+      isBank = kind == ord('b')
+      isCash = kind == ord('c')
+      ids = [block.column(3), block.column(4), block.column(6)[isBank], block.column(7)[isBank]]
+      if _distinct["precision"] is None:
+        # sketches hash the byte arrays directly, sets need Python bytes
+        ids = [i.tolist() for i in ids]
+      totals.addArrays(isBank, isCash, block.cents(2), *ids)
+      # views on the map must be gone before it is closed
+      del block
+  return totals
+
+def processDepositsMapped(fname="deposits", workers=0, blockSize=64 << 20):
+  """Aggregate uncompressed deposits (or their part files) through a memory map.
+
+  Same totals as the chunked engine, without reading the file through
+  Python buffers: boundaries, type flags and cents come from vectorized
+  scans of the mapped bytes.
+  """
+  tasks = []
+  for path in depositFiles(fname):
+    tasks.extend(rangeTasks(path, 0, os.path.getsize(path), workers, blockSize))
+  totals = scanTasks(scanMapped, tasks, workers)
+  totals.report()
+  return totals
+
+def compareDistinct(exact, approx, tag='#####'):
+  """Print exact next to approximate unique ID counts and the relative error."""
+  for name in ID_SETS:
+    n, e = len(getattr(exact, name)), len(getattr(approx, name))
+    print('{} unique {:15s} exact {:12,d} approx {:12,d} error {:+7.2%}'.format(tag, name, n, e, (e - n) / n if n else 0.0))
+  print('{} HyperLogLog precision {} standard error {:.2%}'.format(tag, approx.to_customers.precision, approx.to_customers.error()))
+
+def lastLineEnd(path, size, step=1 << 16):
+  # offset just past the last newline, a line still being appended waits
+  with open(path, 'rb') as f:
+    end = size
+    while end > 0:
+      start = max(end - step, 0)
+      f.seek(start)
+      cut = f.read(end - start).rfind(b'\n')
+      if cut >= 0:
+        return start + cut + 1
+      end = start
+  return 0
+
+def packIDs(ids):
+  # sorted fixed width bytes, no per ID object overhead
+  if not ids:
+    return np.array([], dtype='S1')
+  return np.array(sorted(i.encode() if isinstance(i, str) else i for i in ids), dtype=bytes)
+
+def saveCheckpoint(path, totals, files, fmt="csv", zip=False):
+  """Save totals, distinct IDs and per file progress to path (an .npz).
+
+  files maps each deposits file to the byte offset it was processed up
+  to; the file is written aside and renamed so a crash keeps the old one.
+  HyperLogLog sketches are saved as their registers.
+  """
+  precision = _distinct["precision"]
+  if precision is None:
+    sample = [next(iter(getattr(totals, name)), b'') for name in ID_SETS]
+    arrays = {name: packIDs(getattr(totals, name)) for name in ID_SETS}
+  else:
+    sample = []
+    arrays = {name: getattr(totals, name).registers for name in ID_SETS}
+  meta = {
+    "version":   CHECKPOINT_VERSION,
+    "format":    fmt,
+    "zip":       bool(zip),
+    "text":      any(isinstance(v, str) for v in sample),
+    "precision": precision,
+    "files":     files,
+    "totals":    {name: getattr(totals, name) for name in COUNTERS},
+  }
+  tmp = path + '.tmp'
+  with open(tmp, 'wb') as f:
+    np.savez_compressed(f, meta=np.array(json.dumps(meta)), **arrays)
+  os.replace(tmp, path)
+
+def loadCheckpoint(path):
+  """(DepositTotals, meta) saved by saveCheckpoint."""
+  with np.load(path) as data:
+    meta = json.loads(str(data['meta']))
+    if meta.get("version") != CHECKPOINT_VERSION:
+      raise ValueError('{}: unsupported checkpoint version {}'.format(path, meta.get("version")))
+    totals = DepositTotals()
+    for name in COUNTERS:
+      setattr(totals, name, meta["totals"][name])
+    precision = meta.get("precision")
+    for name in ID_SETS:
+      if precision is not None:
+        setattr(totals, name, HyperLogLog(precision, registers=data[name].copy()))
+        continue
+      values = data[name].tolist()
+      if meta["text"]:
+        values = [v.decode() for v in values]
+      setattr(totals, name, set(values))
+  return totals, meta
+
+def processDepositsIncremental(fname="deposits", zip=False, fmt="csv", checkpoint="deposits.ckpt.npz", workers=0, blockSize=16 << 20):
+  """Aggregate only what was appended since the last checkpoint.
+
+  CSV files resume at the byte offset after the last complete line seen,
+  compressed ones at their previous compressed size (appends must add
+  whole gzip members / zstd frames, as our writers do), and columnar part
+  files are taken whole when they first appear. The merged totals and the
+  new offsets are saved back to checkpoint.
+  """
+  if os.path.exists(checkpoint):
+    totals, meta = loadCheckpoint(checkpoint)
+    if (meta["format"], meta["zip"]) != (fmt, bool(zip)):
+      raise ValueError('{} was written for format {} zip {}'.format(checkpoint, meta["format"], meta["zip"]))
+    if meta.get("precision") != _distinct["precision"]:
+      raise ValueError('{} holds {} distinct counts'.format(checkpoint, "exact" if meta.get("precision") is None else "precision {} HyperLogLog".format(meta["precision"])))
+    files = meta["files"]
+  else:
+    totals, files = DepositTotals(), {}
+
+  tasks, columnar = [], []
+  for path in depositFiles(fname, zip, fmt):
+    size = os.path.getsize(path)
+    done = files.get(path, 0)
+    if size < done or (fmt != "csv" and path in files and size != done):
+      raise ValueError('{} changed since {} was saved, remove the checkpoint to start over'.format(path, checkpoint))
+    if fmt != "csv":
+      if path not in files:
+        columnar.append(path)
+      files[path] = size
+    elif zip:
+      if size > done:
+        tasks.append((path, done, None, blockSize))
+      files[path] = size
+    else:
+      end = lastLineEnd(path, size)
+      if end > done:
+        tasks.extend(rangeTasks(path, done, end, workers, blockSize))
+      files[path] = max(end, done)
+
+  new = scanTasks(scanColumnar, columnar, workers) if fmt != "csv" else scanTasks(scanRange, tasks, workers)
+  totals.merge(new)
+  saveCheckpoint(checkpoint, totals, files, fmt=fmt, zip=zip)
+  print('##### {:10,d} new records, checkpoint {}'.format(new.numRecords, checkpoint))
+  totals.report()
+  return new
+
+def jsonBlocks(path, blockSize=16 << 20):
+  """Yield JSON lines deposits as (timestamps, amounts, to_customers, to_banks) blocks."""
+  loads = serializer().loads
+  f = openReader(path) if path.endswith(('.gz', '.zst')) else open(path, 'rb')
+  with f:
+    while True:
+      lines = f.readlines(blockSize)
+      if not lines:
+        break
+      records = [loads(l) for l in lines if len(l) > 1]
+      yield ([r["timestamp"] for r in records], np.array([r["amount"] for r in records], dtype=np.float64),
+             [r["to_customer"] for r in records], [r["to_bank"] for r in records])
+
+def csvBlocks(path, blockSize=16 << 20):
+  """Yield CSV deposits as (timestamps, amounts, to_customers, to_banks) blocks."""
+  for cols in depositBlocks(path, blockSize=blockSize):
+    if cols and cols[0]:
+      yield cols[0], np.array(cols[2]).astype(np.float64), cols[3], cols[4]
+
+def processDepositsGrouped(fname="deposits", zip=False, keys=GROUP_KEYS, source="csv", partitions=0, spillDir=None, blockSize=16 << 20):
+  """Count, total, min and max amount per to_bank / to_customer / hour.
+
+  Reads the CSV or JSON lines deposits (or their part files) in blocks and
+  writes one fname.by-<key>.csv per key. String keys go through HashGroups,
+  spilled to partitions on disk when partitions > 0.
+  """
+  groups = {k: DenseGroups(24) if k == "hour" else HashGroups(partitions, spillDir) for k in keys}
+  blocks = jsonBlocks if source == "json" else csvBlocks
+  numRecords = 0
+  try:
+    for path in depositFiles(fname, zip, source):
+      for stamps, amounts, toCustomers, toBanks in blocks(path, blockSize):
+        cents = np.rint(amounts * 100).astype(np.int64)
+        numRecords += len(cents)
+        for key, grouper in groups.items():
+          if key == "hour":
+            grouper.add(hourKeys(stamps), cents)
+          else:
+            grouper.add(toCustomers if key == "to_customer" else toBanks, cents)
+    for key, grouper in groups.items():
+      out = "{}.by-{}.csv".format(fname, key)
+      print('##### {:10,d} groups by {} written to {}'.format(writeGroups(out, key, grouper.rows()), key, out))
+  finally:
+    for grouper in groups.values():
+      if isinstance(grouper, HashGroups):
+        grouper.close()
   return numRecords
 
 def str2bool(v):
@@ -89,16 +546,47 @@ def str2bool(v):
 def main():
   args = getArgs()
   print(args)
+  useCompression(args.codec, threads=args.compress_threads or None)
+  precision = args.hll_precision if args.approx_distinct else None
+  useApproxDistinct(precision)
 
   start = timer()
   start_time = datetime.now()
 
-  numRec = processDeposits(fname=args.fdeposits, zip=args.gzip)
+  if args.group_by:
+    numRec = processDepositsGrouped(fname=args.fdeposits, zip=args.gzip, keys=args.group_by, source=args.group_source, partitions=args.partitions, spillDir=args.spill_dir, blockSize=args.block << 20)
+  elif args.checkpoint:
+    numRec = processDepositsIncremental(fname=args.fdeposits, zip=args.gzip, fmt=args.format, checkpoint=args.checkpoint, workers=args.workers, blockSize=args.block << 20).numRecords
+  elif args.format != "csv":
+    numRec = processDepositsColumnar(fname=args.fdeposits, fmt=args.format, workers=args.workers).numRecords
+  elif args.validate:
+    # the Decimal reference always counts exactly
+    useApproxDistinct(None)
+    reference = DepositTotals()
+    processDeposits(fname=args.fdeposits, zip=args.gzip, totals=reference)
+    useApproxDistinct(precision)
+    if args.engine == "mmap":
+      chunked = processDepositsMapped(fname=args.fdeposits, workers=args.workers, blockSize=args.block << 20)
+    else:
+      chunked = processDepositsChunked(fname=args.fdeposits, zip=args.gzip, workers=args.workers, blockSize=args.block << 20)
+    if precision is None:
+      same = (reference.summary() == chunked.summary())
+    else:
+      same = (reference.summary()[:len(COUNTERS)] == chunked.summary()[:len(COUNTERS)])
+      compareDistinct(reference, chunked)
+    print('##### engines {}'.format('MATCH' if same else 'DIFFER'))
+    numRec = chunked.numRecords
+  elif args.engine == "mmap":
+    numRec = processDepositsMapped(fname=args.fdeposits, workers=args.workers, blockSize=args.block << 20).numRecords
+  elif args.engine == "chunked":
+    numRec = processDepositsChunked(fname=args.fdeposits, zip=args.gzip, workers=args.workers, blockSize=args.block << 20).numRecords
+  else:
+    numRec = processDeposits(fname=args.fdeposits, zip=args.gzip)
 
   end = timer()
   time_elapsed = datetime.now() - start_time
   print('per record Time (hh:mm:ss.ms) {}'.format(
-    timedelta(seconds=end - start) / numRec))
+    timedelta(seconds=end - start) / max(numRec, 1)))
   print(
     'Clock Time (hh:mm:ss.ms) {} for {} records'.format(time_elapsed, numRec))
 
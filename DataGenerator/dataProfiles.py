@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+"""Pooled customer profiles, a fast stand-in for fake.profile().
+
+Faker is only called to fill one pool per field (names, addresses, jobs,
+...); customers are then built by vectorized index sampling into the
+pools. ssn and mail can be made unique per customer index: ssn through a
+keyed affine permutation of the whole SSN space, mail by suffixing the
+customer index.
+"""
+
+import math
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+
+from dataFormats import BLOOD_GROUPS
+
+UNIQUE_FIELDS = ["ssn", "mail"]
+
+# en_US ssn(): area 001-899 without 666, group 01-99, serial 0001-9999
+SSN_GROUPS  = 99
+SSN_SERIALS = 9999
+SSN_SPACE   = 898 * SSN_GROUPS * SSN_SERIALS
+
+class SSNPermutation:
+  """Unique ssns by index: a keyed affine bijection of the whole SSN space."""
+  def __init__(self, key=0):
+    # multiplier coprime with the SSN space makes i -> a*i+b mod space a bijection
+    keyed = np.random.default_rng(key)
+    self.mul = int(keyed.integers(1, SSN_SPACE))
+    while math.gcd(self.mul, SSN_SPACE) != 1:
+      self.mul += 1
+    self.add = int(keyed.integers(0, SSN_SPACE))
+
+  def format(self, indices):
+    codes = (np.asarray(indices).astype(object) * self.mul + self.add) % SSN_SPACE
+    codes = np.array(codes, dtype=np.int64)
+    area   = codes // (SSN_GROUPS * SSN_SERIALS) + 1
+    area  += area >= 666
+    group  = codes // SSN_SERIALS % SSN_GROUPS + 1
+    serial = codes % SSN_SERIALS + 1
+    return ['%03d-%02d-%04d' % t for t in zip(area.tolist(), group.tolist(), serial.tolist())]
+
+class ProfilePool:
+  """Per field value pools plus the sampler that assembles profiles.
+
+  Faker runs at a few thousand values a second, so pools are small and
+  names and mails are combined from independent pools (first x last name,
+  username x domain) to keep them varied.
+  fake fills the pools, rng draws the indices into them and key (an int)
+  fixes the unique ssn permutation so that shards built with different
+  rngs but the same key never hand out the same ssn.
+  """
+  def __init__(self, fake, rng, size=2000, unique=UNIQUE_FIELDS, key=0):
+    self.rng    = rng
+    self.size   = size
+    self.unique = set(unique)
+    self.pools = {
+      "job":      [fake.job() for _ in range(size)],
+      "company":  [fake.company() for _ in range(size)],
+      "ssn":      [fake.ssn() for _ in range(size)],
+      "address":  [fake.address() for _ in range(size)],
+      "url":      [fake.url() for _ in range(size)],
+      "username": [fake.user_name() for _ in range(size)],
+      "F":        [fake.first_name_female() for _ in range(size)],
+      "M":        [fake.first_name_male() for _ in range(size)],
+      "last":     [fake.last_name() for _ in range(size)],
+      "domain":   [fake.free_email_domain() for _ in range(min(size, 100))],
+    }
+    self.pools = {k: np.array(v, dtype=object) for k, v in self.pools.items()}
+    self.ssns = SSNPermutation(key)
+    # date_of_birth(): uniform between 115 years ago and today
+    self.today = date.today()
+    self.oldest = (self.today - timedelta(days=115 * 365 + 28)).toordinal()
+
+  def pick(self, pool, num):
+    values = self.pools[pool]
+    return values[self.rng.integers(0, len(values), num)]
+
+  def uniqueSSNs(self, indices):
+    return self.ssns.format(indices)
+
+  def profiles(self, indices):
+    """Profiles (dicts keyed like fake.profile()) for the customer indices."""
+    num = len(indices)
+    rng = self.rng
+    sex = np.where(rng.random(num) < 0.5, "F", "M")
+    first = np.where(sex == "F", self.pick("F", num), self.pick("M", num))
+    names = [f + ' ' + l for f, l in zip(first.tolist(), self.pick("last", num).tolist())]
+    usernames = self.pick("username", num)
+    if "mail" in self.unique:
+      mails = ['{}{}@{}'.format(u, i, d) for u, i, d in zip(usernames.tolist(), indices.tolist(), self.pick("domain", num).tolist())]
+    else:
+      mails = [u + '@' + d for u, d in zip(self.pick("username", num).tolist(), self.pick("domain", num).tolist())]
+    ssns = self.uniqueSSNs(indices) if "ssn" in self.unique else self.pick("ssn", num).tolist()
+
+    # 1 to 4 websites per profile, drawn as one flat pick and split
+    counts = rng.integers(1, 5, num)
+    urls = np.split(self.pick("url", int(counts.sum())), np.cumsum(counts)[:-1])
+
+    lat = rng.integers(-900000000, 900000001, num)
+    lon = rng.integers(-1800000000, 1800000001, num)
+    births = rng.integers(self.oldest, self.today.toordinal() + 1, num)
+    return [
+      {
+        "job":              job,
+        "company":          company,
+        "ssn":              ssn,
+        "residence":        residence,
+        "current_location": (Decimal(la).scaleb(-7), Decimal(lo).scaleb(-7)),
+        "blood_group":      blood,
+        "website":          website.tolist(),
+        "username":         username,
+        "name":             name,
+        "sex":              s,
+        "address":          address,
+        "mail":             mail,
+        "birthdate":        date.fromordinal(birth),
+      }
+      for job, company, ssn, residence, la, lo, blood, website, username, name, s, address, mail, birth in zip(
+        self.pick("job", num).tolist(), self.pick("company", num).tolist(), ssns,
+        self.pick("address", num).tolist(), lat.tolist(), lon.tolist(),
+        np.array(BLOOD_GROUPS)[rng.integers(0, len(BLOOD_GROUPS), num)].tolist(), urls,
+        usernames.tolist(), names, sex.tolist(), self.pick("address", num).tolist(), mails, births.tolist())
+    ]
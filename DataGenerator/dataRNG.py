@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+"""One seed, many independent random streams.
+
+Every consumer asks RNGStreams for a named stream (IDs, deposits, pools,
+Faker, ...) and splits it further per worker or per chunk with child(i);
+all of them are NumPy SeedSequences derived from the one seed, so streams
+never overlap and any of them can be rebuilt on its own, in any process,
+in any order. seed=None draws fresh entropy, which is kept in .entropy
+so an unseeded run can still be repeated.
+"""
+
+import random
+
+import numpy as np
+
+# stream kinds, the first four are the ones sharded dataGenerate runs always used
+STREAMS = {"customer-ids": 0, "bank-ids": 1, "customers": 2, "deposits": 3,
+           "samplers": 4, "pool": 5, "faker": 6, "random": 7, "rows": 8, "ssn": 9}
+
+class RNGStreams:
+  """Splittable source of np.random.Generator streams and integer seeds.
+
+  named(kind) is an independent stream per purpose, child(i) / spawn(n)
+  the i-th of its splits (the same as SeedSequence.spawn(), but without
+  state: child(3) is the same stream however often it is asked for).
+  """
+  def __init__(self, seed=None, sequence=None):
+    self.sequence = sequence if sequence is not None else np.random.SeedSequence(seed)
+
+  @property
+  def entropy(self):
+    return self.sequence.entropy
+
+  def named(self, kind):
+    kind = STREAMS[kind] if isinstance(kind, str) else kind
+    entropy = self.entropy
+    entropy = list(entropy) if isinstance(entropy, (list, tuple)) else [entropy]
+    return RNGStreams(sequence=np.random.SeedSequence(entropy + [kind], spawn_key=self.sequence.spawn_key))
+
+  def child(self, i):
+    return RNGStreams(sequence=np.random.SeedSequence(self.entropy, spawn_key=self.sequence.spawn_key + (i,)))
+
+  def spawn(self, n):
+    return [self.child(i) for i in range(n)]
+
+  def generator(self):
+    return np.random.default_rng(self.sequence)
+
+  def generators(self, first=0):
+    """Endless per chunk generators: chunk i always gets child(i)."""
+    i = first
+    while True:
+      yield self.child(i).generator()
+      i += 1
+
+  def seed(self):
+    """32-bit integer seed for APIs that want one (Faker, random, IDAllocator)."""
+    return int(self.sequence.generate_state(1)[0])
+
+  def seedGlobals(self, fake=None):
+    # the stdlib random module and a Faker instance, for the per record paths
+    random.seed(self.named("random").seed())
+    if fake is not None:
+      fake.seed_instance(self.named("faker").seed())
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+"""Skewed and time varying samplers for the batched deposit generator.
+
+Discrete distributions (Zipf popularity of customers and banks, minutes
+of the day) are turned once into alias tables, after which every draw is
+one uniform index plus one coin flip, O(1) whatever the number of keys.
+Amounts can be log-normal, and timestamps follow a diurnal or bursty
+intensity: given how many deposits a day has, the arrival times of an
+inhomogeneous Poisson process are independent draws with density
+proportional to the intensity, which is what stamps() returns.
+"""
+
+import numpy as np
+
+AMOUNTS    = ["normal", "lognormal"]
+TIMESTAMPS = ["uniform", "diurnal", "bursty"]
+
+class AliasTable:
+  """Walker/Vose alias table over len(weights) outcomes.
+
+  Built vectorized: each round hands every underfull column to the
+  overfull column its deficit falls in (by cumulative sums), columns
+  pushed under 1 become underfull for the next round.
+  """
+  def __init__(self, weights):
+    weights = np.asarray(weights, dtype=np.float64)
+    n = len(weights)
+    if n == 0 or weights.min() < 0 or weights.sum() <= 0:
+      raise ValueError('alias table needs non negative weights with a positive sum')
+    scaled = weights * (n / weights.sum())
+    self.prob  = np.ones(n)
+    self.alias = np.arange(n)
+    small = np.flatnonzero(scaled < 1)
+    large = np.flatnonzero(scaled >= 1)
+    while len(small) and len(large):
+      deficit  = 1 - scaled[small]
+      capacity = np.cumsum(scaled[large] - 1)
+      owner = np.searchsorted(capacity, np.cumsum(deficit) - deficit, side='right')
+      done = owner < len(large)
+      if not done.any():
+        break
+      self.prob[small[done]]  = scaled[small[done]]
+      self.alias[small[done]] = large[owner[done]]
+      scaled[large] -= np.bincount(owner[done], weights=deficit[done], minlength=len(large))
+      under = scaled[large] < 1
+      small = np.concatenate([small[~done], large[under]])
+      large = large[~under]
+    # whatever is left over is 1 up to rounding
+
+  def __len__(self):
+    return len(self.prob)
+
+  def sample(self, rng, size):
+    column = rng.integers(0, len(self.prob), size)
+    return np.where(rng.random(size) < self.prob[column], column, self.alias[column])
+
+class TreeSampler:
+  """Paths of a tree {a: {b: [c, ...]}} drawn like a uniform choice per level.
+
+  The tree is flattened once: every leaf path gets the product of the
+  1/branching factors along it, one alias table draws leaves and
+  columns[level][leaf] gives each level's value.
+  """
+  def __init__(self, tree):
+    paths, weights = [], []
+    def walk(node, path, weight):
+      children = list(node)
+      for child in children:
+        if isinstance(node, dict):
+          walk(node[child], path + [child], weight / len(children))
+        else:
+          paths.append(path + [child])
+          weights.append(weight / len(children))
+    walk(tree, [], 1.0)
+    depths = {len(p) for p in paths}
+    if len(depths) != 1:
+      raise ValueError('tree leaves must all be at the same depth, found {}'.format(sorted(depths)))
+    self.depth   = depths.pop()
+    self.columns = [np.array([p[level] for p in paths]) for level in range(self.depth)]
+    self.table   = AliasTable(weights)
+
+  def __len__(self):
+    return len(self.table)
+
+  def sample(self, rng, num):
+    """Leaf indices, index columns[level] with them."""
+    return self.table.sample(rng, num)
+
+def zipfWeights(n, exponent=1.1):
+  return np.arange(1, n + 1, dtype=np.float64) ** -exponent
+
+def popularity(n, exponent, rng):
+  """Alias table of Zipf(exponent) popularity over n keys in random order, None if exponent is 0."""
+  if exponent <= 0:
+    return None
+  # hot keys are spread over the ID space instead of being the first ones
+  return AliasTable(zipfWeights(n, exponent)[rng.permutation(n)])
+
+def lognormalAmounts(rng, num, mean=100, std=20):
+  # log-normal with the requested mean and standard deviation, in dollars rounded to cents
+  sigma2 = np.log1p((std / mean) ** 2)
+  return np.round(rng.lognormal(np.log(mean) - sigma2 / 2, np.sqrt(sigma2), num), 2)
+
+def diurnalIntensity(hours):
+  # quiet nights, a morning peak, lunch and a longer evening peak
+  peaks = [(9.5, 1.5, 1.0), (13.0, 1.0, 0.6), (18.5, 2.0, 0.8)]
+  return 0.1 + sum(a * np.exp(-0.5 * ((hours - h) / s) ** 2) for h, s, a in peaks)
+
+def minuteProfile(start, end, kind="diurnal", rng=None, bursts=5):
+  """Relative intensity per minute of [start, end) for a timestamp profile."""
+  minutes = int((end - start) // np.timedelta64(1, 'm'))
+  offset = (start - start.astype('datetime64[D]')) / np.timedelta64(1, 'h')
+  hours = offset + np.arange(minutes) / 60.0
+  if kind == "uniform":
+    return np.ones(minutes)
+  intensity = diurnalIntensity(hours % 24)
+  if kind == "bursty":
+    # short spikes (5-30 minutes) at about 10 times the mean rate
+    level = intensity.mean() * 10
+    for first, length in zip(rng.integers(0, minutes, bursts), rng.integers(5, 31, bursts)):
+      intensity[first:first + length] += level
+  return intensity
+
+class DepositSamplers:
+  """Draws for drawDeposits(): skewed customers/banks, amounts and timestamps.
+
+  customerSkew / bankSkew are Zipf exponents (0 keeps them uniform),
+  amounts is one of AMOUNTS and timestamps one of TIMESTAMPS. The tables
+  come from seed so that every shard shares the same hot keys and bursts.
+  """
+  def __init__(self, numCustomers, numBanks, start, end, customerSkew=0.0, bankSkew=0.0, amounts="normal", timestamps="uniform", bursts=5, seed=None):
+    rng = np.random.default_rng(seed)
+    self.customerTable = popularity(numCustomers, customerSkew, rng)
+    self.bankTable     = popularity(numBanks, bankSkew, rng)
+    self.amounts       = amounts
+    self.minuteTable   = None if timestamps == "uniform" else AliasTable(minuteProfile(start, end, timestamps, rng, bursts))
+
+  def keys(self, rng, table, n, num):
+    """num (to, from) key positions, from != to like random.sample(..., 2)."""
+    if n < 2:
+      raise ValueError('need at least 2 keys to draw distinct (to, from) pairs, got {}'.format(n))
+    if table is None:
+      to = rng.integers(0, n, num)
+      other = rng.integers(0, n - 1, num)
+      return to, other + (other >= to)
+    to, other = table.sample(rng, num), table.sample(rng, num)
+    clash = np.flatnonzero(other == to)
+    while len(clash):
+      other[clash] = table.sample(rng, len(clash))
+      clash = clash[other[clash] == to[clash]]
+    return to, other
+
+  def customers(self, rng, n, num):
+    return self.keys(rng, self.customerTable, n, num)
+
+  def banks(self, rng, n, num):
+    return self.keys(rng, self.bankTable, n, num)
+
+  def amount(self, rng, num, mean=100, std=20):
+    if self.amounts == "lognormal":
+      return lognormalAmounts(rng, num, mean, std)
+    return np.round(rng.normal(mean, std, num), 2)
+
+  def stamps(self, rng, num, start, end):
+    if self.minuteTable is None:
+      return start + rng.integers(0, (end - start).astype(np.int64), num).astype('timedelta64[us]')
+    minute = self.minuteTable.sample(rng, num)
+    return start + (minute * 60000000 + rng.integers(0, 60000000, num)).astype('timedelta64[us]')
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+
+"""Schema driven dataset generation: declare fields, get vectorized batches.
+
+A schema (JSON, or YAML when PyYAML is installed) lists fields with a
+generator and its parameters; fields can depend on other fields ("by",
+"of" or an explicit "depends" list), e.g. an org chosen per office and a
+salary range per title. compileSchema() orders the fields by their
+dependencies once and builds one batch function per field, so a batch of
+rows costs a few NumPy operations per column instead of Python calls per
+row. Faker values come from pools filled at compile time; per row Python
+functions (GenTestData's registry) still plug in through the "row"
+generator.
+
+  {"name": "people", "rows": 1000, "output": "people.csv",
+   "fields": [
+     {"name": "gender", "generator": "choice", "values": ["M", "F"]},
+     {"name": "first_name", "generator": "faker", "by": "gender",
+      "providers": {"M": "first_name_male", "F": "first_name_female"}},
+     {"name": "age", "generator": "randint", "low": 18, "high": 65}]}
+"""
+
+import csv, itertools, json, os
+
+import numpy as np
+
+from dataDates import DATE_FORMAT, DayFormatter, birthAndStartDays, today, windowsBirthAndStartDays
+from dataProfiles import SSNPermutation
+from dataRNG import RNGStreams
+from dataSamplers import AliasTable, TreeSampler
+from dataSerialize import serializer
+
+try:
+  import yaml
+except ImportError:
+  yaml = None
+
+SCHEMA_FORMATS = ["csv", "json"]
+POOL_SIZE      = 2000
+GENERATORS     = {}
+ROW_FUNCTIONS  = {}
+
+def generator(name):
+  """Register a field generator: factory(spec, plan) -> draw(rng, num, cols, first)."""
+  def register(factory):
+    GENERATORS[name] = factory
+    return factory
+  return register
+
+def registerRows(functions):
+  """Make per row functions (returning a dict of values) usable as "row" fields."""
+  ROW_FUNCTIONS.update(functions)
+
+def roundTo(values, step=None):
+  # like round(x / step) * step, ties to even as Python's round()
+  if not step:
+    return values
+  rounded = np.round(values / step) * step
+  return rounded.astype(np.int64) if float(step).is_integer() else rounded
+
+def keyCodes(column, keys, field):
+  """Position in keys of every value of a parent column."""
+  keys = np.array(keys)
+  order = np.argsort(keys)
+  values = np.asarray(column).astype(keys.dtype) if keys.dtype.kind in 'iuf' else np.asarray(column, dtype=str)
+  pos = np.minimum(np.searchsorted(keys[order], values), len(keys) - 1)
+  missing = keys[order][pos] != values
+  if missing.any():
+    raise ValueError('{}: no entry for {!r}'.format(field, values[missing][0]))
+  return order[pos]
+
+@generator("sequence")
+def sequenceField(spec, plan):
+  start, step = spec.get("start", 1), spec.get("step", 1)
+  return lambda rng, num, cols, first: start + (first + np.arange(num)) * step
+
+@generator("randint")
+def randintField(spec, plan):
+  # both ends included, like random.randint()
+  low, high, step = spec["low"], spec["high"], spec.get("round")
+  return lambda rng, num, cols, first: roundTo(rng.integers(low, high + 1, num), step)
+
+@generator("uniform")
+def uniformField(spec, plan):
+  low, high, digits = spec.get("low", 0.0), spec.get("high", 1.0), spec.get("digits")
+  def draw(rng, num, cols, first):
+    values = rng.uniform(low, high, num)
+    return values if digits is None else np.round(values, digits)
+  return draw
+
+@generator("normal")
+def normalField(spec, plan):
+  mean, std, digits = spec.get("mean", 0.0), spec.get("std", 1.0), spec.get("digits")
+  def draw(rng, num, cols, first):
+    values = rng.normal(mean, std, num)
+    return values if digits is None else np.round(values, digits)
+  return draw
+
+@generator("lognormal")
+def lognormalField(spec, plan):
+  # parameterized by the mean and standard deviation of the values themselves
+  mean, std, digits = spec["mean"], spec["std"], spec.get("digits")
+  sigma2 = np.log1p((std / mean) ** 2)
+  def draw(rng, num, cols, first):
+    values = rng.lognormal(np.log(mean) - sigma2 / 2, np.sqrt(sigma2), num)
+    return values if digits is None else np.round(values, digits)
+  return draw
+
+@generator("choice")
+def choiceField(spec, plan):
+  values = np.array(spec["values"])
+  if "weights" in spec:
+    table = AliasTable(spec["weights"])
+    return lambda rng, num, cols, first: values[table.sample(rng, num)]
+  return lambda rng, num, cols, first: values[rng.integers(0, len(values), num)]
+
+@generator("choice_by")
+def choiceByField(spec, plan):
+  """Uniform choice among values[parent], like random.choice(allowed[parent])."""
+  by, table = spec["by"], spec["values"]
+  keys = list(table)
+  counts = np.array([len(table[k]) for k in keys])
+  offsets = np.r_[0, np.cumsum(counts)[:-1]]
+  flat = np.array([v for k in keys for v in table[k]])
+  def draw(rng, num, cols, first):
+    code = keyCodes(cols[by], keys, spec["name"])
+    return flat[offsets[code] + (rng.random(num) * counts[code]).astype(np.int64)]
+  return draw
+
+@generator("range_by")
+def rangeByField(spec, plan):
+  """Integer in [low, high] of ranges[parent], rounded to a multiple of round."""
+  by, ranges, step = spec["by"], spec["ranges"], spec.get("round")
+  keys = list(ranges)
+  low  = np.array([ranges[k][0] for k in keys], dtype=np.int64)
+  high = np.array([ranges[k][1] for k in keys], dtype=np.int64)
+  def draw(rng, num, cols, first):
+    code = keyCodes(cols[by], keys, spec["name"])
+    return roundTo(rng.integers(low[code], high[code] + 1), step)
+  return draw
+
+@generator("hierarchy")
+def hierarchyField(spec, plan):
+  """Several dependent columns from one tree draw, e.g. office -> org -> title.
+
+  "tree" nests one level per entry of "levels" (the last one a list),
+  an optional "value" column gets an integer in "ranges"[leaf] rounded to
+  "round", like range_by on the last level but without any lookups.
+  """
+  sampler = TreeSampler(spec["tree"])
+  levels, value = spec["levels"], spec.get("value")
+  if len(levels) != sampler.depth:
+    raise ValueError('{}: {} levels for a tree of depth {}'.format(spec["name"], len(levels), sampler.depth))
+  if value:
+    ranges, step = spec["ranges"], spec.get("round")
+    leaves = sampler.columns[-1].tolist()
+    low  = np.array([ranges[leaf][0] for leaf in leaves], dtype=np.int64)
+    high = np.array([ranges[leaf][1] for leaf in leaves], dtype=np.int64)
+  order = spec.get("columns", levels + ([value] if value else []))
+  def draw(rng, num, cols, first):
+    leaf = sampler.sample(rng, num)
+    out = {name: sampler.columns[i][leaf] for i, name in enumerate(levels)}
+    if value:
+      out[value] = roundTo(rng.integers(low[leaf], high[leaf] + 1), step)
+    return {c: out[c] for c in order}
+  return draw
+
+@generator("ratio")
+def ratioField(spec, plan):
+  """A uniform fraction of another numeric field, e.g. a bonus of a salary."""
+  of, low, high, step = spec["of"], spec["low"], spec["high"], spec.get("round")
+  return lambda rng, num, cols, first: roundTo(np.asarray(cols[of]) * rng.uniform(low, high, num), step)
+
+@generator("faker")
+def fakerField(spec, plan):
+  """Faker provider values sampled from a pool ("pool": 0 calls Faker per row).
+
+  With "by" the provider is picked per row from "providers", keyed by
+  the value of the parent field (first_name_male / first_name_female).
+  """
+  by = spec.get("by")
+  providers = spec["providers"] if by else {None: spec["provider"]}
+  size = spec.get("pool", POOL_SIZE)
+  fake = plan.fake
+  if size == 0:
+    calls = {k: getattr(fake, p) for k, p in providers.items()}
+    if not by:
+      return lambda rng, num, cols, first: np.array([calls[None]() for _ in range(num)], dtype=object)
+    return lambda rng, num, cols, first: np.array([calls[k]() for k in np.asarray(cols[by]).tolist()], dtype=object)
+  pools = {k: np.array([getattr(fake, p)() for _ in range(size)], dtype=object) for k, p in providers.items()}
+  if not by:
+    return lambda rng, num, cols, first: pools[None][rng.integers(0, size, num)]
+  keys = list(pools)
+  stacked = np.stack([pools[k] for k in keys])
+  def draw(rng, num, cols, first):
+    return stacked[keyCodes(cols[by], keys, spec["name"]), rng.integers(0, size, num)]
+  return draw
+
+@generator("ssn")
+def ssnField(spec, plan):
+  # unique per row (and across batches) unless "unique" is false
+  if not spec.get("unique", True):
+    return fakerField(dict(spec, provider="ssn"), plan)
+  ssns = SSNPermutation(spec.get("key", plan.streams.named("ssn").seed()))
+  return lambda rng, num, cols, first: np.array(ssns.format(first + np.arange(num)), dtype=object)
+
+def parseDay(value):
+  return today() if value in (None, "today", "now") else np.datetime64(value, 'D')
+
+@generator("date")
+def dateField(spec, plan):
+  """Uniform day in [start, end] ("today" by default), formatted with "format"."""
+  low, high = parseDay(spec.get("start", "1970-01-01")), parseDay(spec.get("end"))
+  span = int((high - low).astype(np.int64)) + 1
+  formatter = DayFormatter(spec.get("format", DATE_FORMAT))
+  return lambda rng, num, cols, first: formatter.format(low + rng.integers(0, span, num).astype('timedelta64[D]'))
+
+@generator("date_pair")
+def datePairField(spec, plan):
+  """Birth and start date columns with an 18-40 year gap (see dataDates).
+
+  "mode": "windows" draws them like birth_and_start_date_on_windows().
+  """
+  birthName, startName = spec.get("columns", ["birth_date", "start_date"])
+  formatter = DayFormatter(spec.get("format", DATE_FORMAT))
+  def draw(rng, num, cols, first):
+    if spec.get("mode") == "windows":
+      birth, start = windowsBirthAndStartDays(rng, num)
+    else:
+      birth, start = birthAndStartDays(rng, num, spec.get("start_years", 20), spec.get("min_age", 18), spec.get("max_age", 40))
+    return {birthName: formatter.format(birth), startName: formatter.format(start)}
+  return draw
+
+@generator("row")
+def rowField(spec, plan):
+  """Per row Python function from registerRows(), its dict keys become columns."""
+  name = spec.get("function", spec["name"])
+  if name not in ROW_FUNCTIONS:
+    raise ValueError('{}: unknown row function {} (registered: {})'.format(spec["name"], name, ", ".join(ROW_FUNCTIONS)))
+  function = ROW_FUNCTIONS[name]
+  def draw(rng, num, cols, first):
+    rows = [function() for _ in range(num)]
+    return {k: [r[k] for r in rows] for k in rows[0]} if rows else {}
+  return draw
+
+def fieldDepends(spec):
+  return list(spec.get("depends", [])) + [spec[k] for k in ("by", "of") if k in spec]
+
+class BatchPlan:
+  """A compiled schema: draw functions in dependency order.
+
+  batch() returns the columns of num rows (NumPy arrays, or lists for
+  row functions) in the declared field order; fields with "hidden": true
+  are computed for their dependants but not returned. seed is an int,
+  None or a dataRNG.RNGStreams the plan draws its streams from.
+  """
+  def __init__(self, schema, fake=None, seed=None):
+    self.name  = schema.get("name", "dataset")
+    self.rows  = schema.get("rows", 1000)
+    self.output = schema.get("output")
+    self.fake  = fake
+    self.streams = seed if isinstance(seed, RNGStreams) else RNGStreams(seed)
+    specs = schema["fields"]
+    names = [s["name"] for s in specs]
+    if len(set(names)) != len(names):
+      raise ValueError('{}: duplicate field names'.format(self.name))
+    # columns a field produces, so dependants can name either
+    producer = {}
+    for s in specs:
+      for c in s.get("columns", [s["name"]]):
+        producer[c] = s["name"]
+    self.hidden = {s["name"] for s in specs if s.get("hidden")}
+    self.order = names
+    self.steps = []
+    for s in self.dependencyOrder(specs, producer):
+      kind = s.get("generator", "row")
+      if kind not in GENERATORS:
+        raise ValueError('{}: unknown generator {} (one of {})'.format(s["name"], kind, ", ".join(sorted(GENERATORS))))
+      self.steps.append((s["name"], GENERATORS[kind](s, self)))
+
+  def dependencyOrder(self, specs, producer):
+    byName = {s["name"]: s for s in specs}
+    done, ordered = set(), []
+    def visit(spec, path):
+      if spec["name"] in done:
+        return
+      if spec["name"] in path:
+        raise ValueError('{}: dependency cycle {}'.format(self.name, " -> ".join(path + [spec["name"]])))
+      for dep in fieldDepends(spec):
+        if dep not in producer:
+          raise ValueError('{}: depends on unknown field {}'.format(spec["name"], dep))
+        visit(byName[producer[dep]], path + [spec["name"]])
+      done.add(spec["name"])
+      ordered.append(spec)
+    for s in specs:
+      visit(s, [])
+    return ordered
+
+  def batch(self, rng, num, first=0):
+    cols, produced = {}, {}
+    for name, draw in self.steps:
+      out = draw(rng, num, cols, first)
+      out = out if isinstance(out, dict) else {name: out}
+      cols.update(out)
+      produced[name] = list(out)
+    return {c: cols[c] for name in self.order if name not in self.hidden for c in produced[name]}
+
+  def batches(self, num, batch=10000, rng=None):
+    """Yield batch() column dicts for num rows.
+
+    Without rng batch i draws from its own stream (child i of "rows"),
+    so any batch can be regenerated, or produced elsewhere, on its own.
+    """
+    rngs = self.streams.named("rows").generators() if rng is None else itertools.repeat(rng)
+    first = 0
+    while first < num:
+      size = min(batch, num - first)
+      yield self.batch(next(rngs), size, first)
+      first += size
+
+def loadSchema(path):
+  with open(path) as f:
+    if os.path.splitext(path)[1] in (".yaml", ".yml"):
+      if yaml is None:
+        raise ImportError('YAML schemas need PyYAML (pip install pyyaml)')
+      return yaml.safe_load(f)
+    return json.load(f)
+
+def compileSchema(schema, fake=None, seed=None):
+  """BatchPlan for a schema dict or a path to a schema file."""
+  if isinstance(schema, str):
+    schema = loadSchema(schema)
+  return BatchPlan(schema, fake=fake, seed=seed)
+
+def columnList(values):
+  return values.tolist() if isinstance(values, np.ndarray) else values
+
+def writeDataset(batches, path, fmt="csv"):
+  """Sink: BatchPlan.batches() to a CSV (quoted like DictWriter) or JSON lines file; returns the number of rows."""
+  num = 0
+  with open(path, "w", newline='') as f:
+    writer = None
+    for cols in batches:
+      fields = list(cols)
+      if fmt == "json":
+        kinds = {c: 'num' for c, v in cols.items() if isinstance(v, np.ndarray) and v.dtype.kind in 'iuf'}
+        f.write(serializer().columns({c: columnList(v) for c, v in cols.items()}, fields, kinds))
+      else:
+        if writer is None:
+          writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
+          writer.writerow(fields)
+        writer.writerows(zip(*[columnList(cols[c]) for c in fields]))
+      num += len(cols[fields[0]]) if fields else 0
+  return num
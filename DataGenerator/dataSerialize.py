@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""JSON-lines serializers shared by the generator and the processor.
+
+orjson is used when it is installed ("auto"), the stdlib json module
+otherwise. Both render datetime/date as isoformat() and Decimal as float.
+Records are written as newline-joined batches instead of one print() each.
+"""
+
+import json
+
+from decimal import Decimal
+from datetime import datetime, date
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+ENCODERS = ["auto", "json", "orjson"]
+
+class CustomJsonEncoder(json.JSONEncoder):
+  def default(self, obj):
+    if isinstance(obj, Decimal):
+      return float(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    return super(CustomJsonEncoder, self).default(obj)
+
+def orjsonDefault(obj):
+  if isinstance(obj, Decimal):
+    return float(obj)
+  raise TypeError
+
+class JsonSerializer:
+  """dumps()/loads() for single records, lines() and columns() for whole batches.
+
+  columns() takes a dict of column lists plus a kind per field: 'str' for
+  strings that never need escaping (IDs, IBANs, formatted timestamps),
+  'num' for ints/floats and None for anything else. Known kinds skip the
+  encoder altogether and are pasted into a per schema template.
+  """
+  def __init__(self, name="auto"):
+    if name == "auto":
+      name = "orjson" if orjson is not None else "json"
+    if name == "orjson" and orjson is None:
+      raise ImportError('--encoder orjson needs orjson (pip install orjson)')
+    self.name = name
+    if name == "orjson":
+      # orjson only writes compact separators
+      self.itemSep, self.keySep = ',', ':'
+    else:
+      self.itemSep, self.keySep = ', ', ': '
+
+  def dumps(self, obj):
+    if self.name == "orjson":
+      return orjson.dumps(obj, default=orjsonDefault).decode()
+    return json.dumps(obj, cls=CustomJsonEncoder)
+
+  def loads(self, text):
+    if self.name == "orjson":
+      return orjson.loads(text)
+    return json.loads(text)
+
+  def lines(self, records):
+    if self.name == "orjson":
+      return ''.join([orjson.dumps(r, default=orjsonDefault, option=orjson.OPT_APPEND_NEWLINE).decode() for r in records])
+    dumps = self.dumps
+    return ''.join([dumps(r) + '\n' for r in records])
+
+  def encodeColumn(self, values, kind=None):
+    if kind == 'str':
+      return ['null' if v is None else '"' + v + '"' for v in values]
+    if kind == 'num':
+      return ['null' if v is None else repr(v) for v in values]
+    dumps = self.dumps
+    return [dumps(v) for v in values]
+
+  def columns(self, cols, fields, kinds=None):
+    kinds = kinds or {}
+    template = '{' + self.itemSep.join(json.dumps(f) + self.keySep + '%s' for f in fields) + '}\n'
+    encoded = [self.encodeColumn(cols[f], kinds.get(f)) for f in fields]
+    return ''.join([template % row for row in zip(*encoded)])
+
+_current = None
+
+def useSerializer(name="auto"):
+  global _current
+  _current = JsonSerializer(name)
+  return _current
+
+def serializer():
+  if _current is None:
+    return useSerializer()
+  return _current
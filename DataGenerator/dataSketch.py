@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+"""HyperLogLog sketches for approximate distinct counts.
+
+A sketch of precision p keeps 2**p one byte registers (16KB at the
+default 14) whatever the number of values, with a standard error of about
+1.04 / sqrt(2**p). Sketches of the same precision merge by taking the
+register wise maximum, so partial sketches from workers, byte ranges or
+checkpoints combine exactly like the sets they stand in for.
+"""
+
+import math
+
+import numpy as np
+
+MIN_PRECISION = 4
+MAX_PRECISION = 18
+PENDING       = 1 << 16
+SEED          = np.uint64(0x5851F42D4C957F2D)
+
+def mix64(x):
+  # splitmix64 finalizer
+  x = x ^ (x >> np.uint64(30))
+  x = x * np.uint64(0xBF58476D1CE4E5B9)
+  x = x ^ (x >> np.uint64(27))
+  x = x * np.uint64(0x94D049BB133111EB)
+  return x ^ (x >> np.uint64(31))
+
+def hash64(values):
+  """64-bit hashes of str or bytes values (a list or bytes array), 8 bytes at a time across all values."""
+  if len(values) and isinstance(values[0], str):
+    values = [v.encode() for v in values]
+  keys = np.array(values, dtype=bytes)
+  width = -(-max(keys.dtype.itemsize, 1) // 8) * 8
+  words = keys.astype('S{}'.format(width)).view(np.uint64).reshape(len(keys), width // 8)
+  h = np.full(len(keys), SEED, dtype=np.uint64)
+  for i in range(words.shape[1]):
+    h = mix64(h ^ words[:, i])
+  return h
+
+class HyperLogLog:
+  """Mergeable distinct counter with the set methods DepositTotals uses.
+
+  add() and update() buffer values and hash them in batches, len() is the
+  (rounded) estimate and |= merges another sketch of the same precision.
+  """
+  def __init__(self, precision=14, registers=None):
+    if not MIN_PRECISION <= precision <= MAX_PRECISION:
+      raise ValueError('HyperLogLog precision must be {}-{}'.format(MIN_PRECISION, MAX_PRECISION))
+    self.precision = precision
+    self.registers = np.zeros(1 << precision, dtype=np.uint8) if registers is None else registers
+    self.pending   = []
+
+  def add(self, value):
+    self.pending.append(value)
+    if len(self.pending) >= PENDING:
+      self.flush()
+
+  def update(self, values):
+    if isinstance(values, np.ndarray):
+      # bytes arrays are hashed as they are, no Python objects needed
+      self.flush()
+      if len(values):
+        self.addHashes(hash64(values))
+      return
+    self.pending.extend(values)
+    if len(self.pending) >= PENDING:
+      self.flush()
+
+  def flush(self):
+    if not self.pending:
+      return
+    self.addHashes(hash64(self.pending))
+    self.pending = []
+
+  def addHashes(self, hashes):
+    # top p bits pick the register, the rank is 1 + leading zeros of the rest
+    bits  = 64 - self.precision
+    index = (hashes >> np.uint64(bits)).astype(np.intp)
+    rest  = hashes & np.uint64((1 << bits) - 1)
+    exponent = np.frexp(rest.astype(np.float64))[1]
+    rank = np.where(rest == 0, bits + 1, bits + 1 - exponent).astype(np.uint8)
+    np.maximum.at(self.registers, index, rank)
+
+  def __ior__(self, other):
+    if other.precision != self.precision:
+      raise ValueError('cannot merge HyperLogLog sketches of precision {} and {}'.format(self.precision, other.precision))
+    self.flush()
+    other.flush()
+    np.maximum(self.registers, other.registers, out=self.registers)
+    return self
+
+  def estimate(self):
+    self.flush()
+    m = len(self.registers)
+    alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+    estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+    zeros = int(np.count_nonzero(self.registers == 0))
+    if estimate <= 2.5 * m and zeros:
+      # linear counting is more accurate while many registers are empty
+      estimate = m * math.log(m / zeros)
+    return estimate
+
+  def __len__(self):
+    return int(round(self.estimate()))
+
+  def error(self):
+    """Relative standard error of the estimate."""
+    return 1.04 / math.sqrt(len(self.registers))
+
+  def __getstate__(self):
+    self.flush()
+    return self.__dict__
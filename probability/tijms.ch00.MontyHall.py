@@ -7,6 +7,8 @@
 import  argparse, \
         random
 
+import numpy as np
+
 def simulate(num_doors, switch, verbose):
     """(int, bool [,bool]): bool
 
@@ -71,6 +73,41 @@ def simulate(num_doors, switch, verbose):
     return won
 
 
+def simulate_batch(num_doors, trials, switch, rng):
+    """(int, int, bool, Generator): int
+
+    Carry out 'trials' games at once and return how many the contestant won.
+    The host leaves the winning door closed unless the contestant chose it,
+    in which case the other closed door is a random one of the rest, exactly
+    what the door opening loop in simulate() ends up with.
+    """
+    dtype = np.int32 if num_doors < 2 ** 31 else np.int64
+    winning_door = rng.integers(0, num_doors, trials, dtype=dtype)
+    choice       = rng.integers(0, num_doors, trials, dtype=dtype)
+    if switch:
+        other  = rng.integers(0, num_doors - 1, trials, dtype=dtype)
+        other += other >= choice
+        choice = np.where(choice != winning_door, winning_door, other)
+    return int(np.count_nonzero(choice == winning_door))
+
+
+def simulate_trials(num_doors, trials, rng, chunk=10000000):
+    """(int, int, Generator [,int]): (int, int)
+
+    Play 'trials' games per strategy in chunks of at most 'chunk' games,
+    so memory stays bounded. Returns (winning_switchers, winning_non_switchers).
+    """
+    winning_switchers = 0
+    winning_non_switchers = 0
+    done = 0
+    while done < trials:
+        size = min(chunk, trials - done)
+        winning_non_switchers += simulate_batch(num_doors, size, False, rng)
+        winning_switchers += simulate_batch(num_doors, size, True, rng)
+        done += size
+    return winning_switchers, winning_non_switchers
+
+
 def main():
     # Get command-line arguments
     parser = argparse.ArgumentParser(
@@ -81,23 +118,37 @@ def main():
                         help='number of trials to perform')
     parser.add_argument('--verbose', default=False, action='store_true',
                         help='display the results of each trial')
+    parser.add_argument('--loop', default=False, action='store_true',
+                        help='play one game per call instead of NumPy batches (implied by --verbose)')
+    parser.add_argument('--chunk', default=10000000, type=int, metavar='int',
+                        help='games per NumPy batch')
+    parser.add_argument('--seed', default=None, type=int, metavar='int',
+                        help='random seed for the batches')
     args = parser.parse_args()
+    if args.doors < 2:
+        parser.error('--doors must be at least 2')
+    if args.chunk < 1:
+        parser.error('--chunk must be at least 1')
 
     print('Simulating {:,} trials...'.format(args.trials))
 
     # Carry out the trials
     winning_non_switchers = 0
     winning_switchers = 0
-    for i in range(args.trials):
-        # First, do a trial where the contestant never switches.
-        won = simulate(args.doors, switch=False, verbose=args.verbose)
-        if won:
-            winning_non_switchers += 1
-
-        # Next, try one where the contestant switches.
-        won = simulate(args.doors, switch=True, verbose=args.verbose)
-        if won:
-            winning_switchers += 1
+    if not (args.loop or args.verbose):
+        winning_switchers, winning_non_switchers = simulate_trials(
+            args.doors, args.trials, np.random.default_rng(args.seed), args.chunk)
+    else:
+        for i in range(args.trials):
+            # First, do a trial where the contestant never switches.
+            won = simulate(args.doors, switch=False, verbose=args.verbose)
+            if won:
+                winning_non_switchers += 1
+
+            # Next, try one where the contestant switches.
+            won = simulate(args.doors, switch=True, verbose=args.verbose)
+            if won:
+                winning_switchers += 1
 
     print('    Switching won {0:5,} times out of {1:,} ({2:.4}% of the time)'.format(
             winning_switchers, args.trials,
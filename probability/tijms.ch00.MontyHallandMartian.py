@@ -6,8 +6,11 @@
 """
 
 import  argparse, \
+        math, \
         random
 
+import numpy as np
+
 def simulate(num_doors, switch, verbose):
     """(int, bool [,bool]): [bool, bool]
 
@@ -69,6 +72,84 @@ def simulate(num_doors, switch, verbose):
     return [won,mwon]
 
 
+def simulate_batch(num_doors, trials, switch, rng):
+    """(int, int, bool, Generator): (int, int)
+
+    Carry out 'trials' games at once. The door left closed besides the
+    contestant's is the car door, or a random other door when the contestant
+    chose the car; the Martian picks one of the two closed doors at random.
+    Returns how many games the contestant and the Martian won.
+    """
+    dtype = np.int32 if num_doors < 2 ** 31 else np.int64
+    winning_door = rng.integers(0, num_doors, trials, dtype=dtype)
+    choice       = rng.integers(0, num_doors, trials, dtype=dtype)
+    other        = rng.integers(0, num_doors - 1, trials, dtype=dtype)
+    other       += other >= choice
+    last_door    = np.where(choice != winning_door, winning_door, other)
+    martian_door = np.where(rng.random(trials) < 0.5, last_door, choice)
+    if switch:
+        choice = last_door
+    return int(np.count_nonzero(choice == winning_door)), int(np.count_nonzero(martian_door == winning_door))
+
+
+def simulate_trials(num_doors, trials, rng, chunk=10000000):
+    """(int, int, Generator [,int]): dict
+
+    Both strategies for 'trials' games each, in chunks of at most 'chunk'
+    games. Returns win counts keyed like exact().
+    """
+    wins = dict.fromkeys(['switch', 'switch_martian', 'stay', 'stay_martian'], 0)
+    done = 0
+    while done < trials:
+        size = min(chunk, trials - done)
+        won, mwon = simulate_batch(num_doors, size, False, rng)
+        wins['stay'] += won
+        wins['stay_martian'] += mwon
+        won, mwon = simulate_batch(num_doors, size, True, rng)
+        wins['switch'] += won
+        wins['switch_martian'] += mwon
+        done += size
+    return wins
+
+
+def exact(num_doors):
+    """(int): dict
+
+    Exact winning probabilities: staying wins with the first choice, 1/doors,
+    switching whenever that choice was wrong, (doors-1)/doors. The car is always
+    behind one of the two closed doors, so the Martian wins half the time
+    whatever the contestant does.
+    """
+    return {'switch': (num_doors - 1) / num_doors, 'switch_martian': 0.5,
+            'stay': 1 / num_doors, 'stay_martian': 0.5}
+
+
+def trials_needed(p, precision, z=1.96):
+    """(float, float [,float]): int
+
+    Trials for a simulated frequency to be within 'precision' of p with the
+    confidence of z standard errors (1.96 is 95%).
+    """
+    # the tiny slack keeps p and 1-p from rounding to different counts
+    return math.ceil(z * z * p * (1 - p) / (precision * precision) - 1e-9)
+
+
+def report(wins, probabilities, trials, precision):
+    """(dict, dict, int, float): None
+
+    Print each simulated frequency next to its exact value, the error in
+    standard errors and the trials needed for the target precision.
+    """
+    for key, label in [('switch', '    Switching'), ('switch_martian', '    Martian  '),
+                       ('stay', 'Not switching'), ('stay_martian', '    Martian  ')]:
+        p = probabilities[key]
+        freq = wins[key] / trials
+        stderr = math.sqrt(p * (1 - p) / trials)
+        print('{0} won {1:5,} / {2:,} ({3:.5}% of the time) exact {4:.5}% error {5:+.5f} ({6:+.2f} se) need {7:,} trials for +/-{8}'.format(
+                label, wins[key], trials, freq * 100, p * 100, freq - p,
+                (freq - p) / stderr if stderr else 0.0, trials_needed(p, precision), precision))
+
+
 def main():
     # Get command-line arguments
     parser = argparse.ArgumentParser(
@@ -79,10 +160,37 @@ def main():
                         help='number of trials to perform')
     parser.add_argument('--verbose', default=False, action='store_true',
                         help='display the results of each trial')
+    parser.add_argument('--loop', default=False, action='store_true',
+                        help='play one game per call instead of NumPy batches (implied by --verbose)')
+    parser.add_argument('--chunk', default=10000000, type=int, metavar='int',
+                        help='games per NumPy batch')
+    parser.add_argument('--seed', default=None, type=int, metavar='int',
+                        help='random seed for the batches')
+    parser.add_argument('--exact', default=False, action='store_true',
+                        help='only print the exact probabilities, no simulation')
+    parser.add_argument('--precision', default=0.001, type=float, metavar='float',
+                        help='target precision (95%%) for the trials needed report')
     args = parser.parse_args()
+    if args.doors < 2:
+        parser.error('--doors must be at least 2')
+    if args.chunk < 1:
+        parser.error('--chunk must be at least 1')
+
+    probabilities = exact(args.doors)
+    if args.exact:
+        print('Exact probabilities for {:,} doors'.format(args.doors))
+        for key, label in [('switch', '    Switching'), ('stay', 'Not switching'), ('stay_martian', '    Martian  ')]:
+            print('{} wins {:.8f} ({:,} trials for +/-{} at 95%)'.format(
+                    label, probabilities[key], trials_needed(probabilities[key], args.precision), args.precision))
+        return
 
     print('Simulating {:,} trials...'.format(args.trials))
 
+    if not (args.loop or args.verbose):
+        wins = simulate_trials(args.doors, args.trials, np.random.default_rng(args.seed), args.chunk)
+        report(wins, probabilities, args.trials, args.precision)
+        return
+
     # Carry out the trials
     winning_non_switchers   = 0
     winning_switchers       = 0
@@ -104,19 +212,9 @@ def main():
         if lwon[1]:
             winning_switch_martian += 1
 
-    print('    Switching won {0:5,} / {1:,} ({2:.5}% of the time)'.format(
-            winning_switchers, args.trials,
-            (winning_switchers / args.trials * 100 ) ))
-    print('    Martian   won {0:5,} / {1:,} ({2:.5}% of the time)'.format(
-            winning_switch_martian, args.trials,
-            (winning_switch_martian / args.trials * 100 ) ))
-
-    print('Not switching won {0:5,} / {1:,} ({2:.5}% of the time)'.format(
-            winning_non_switchers, args.trials,
-            (winning_non_switchers / args.trials * 100 ) ))
-    print('    Martian   won {0:5,} / {1:,} ({2:.5}% of the time)'.format(
-            winning_nonsw_martian, args.trials,
-            (winning_nonsw_martian / args.trials * 100 ) ))
+    wins = {'switch': winning_switchers, 'switch_martian': winning_switch_martian,
+            'stay': winning_non_switchers, 'stay_martian': winning_nonsw_martian}
+    report(wins, probabilities, args.trials, args.precision)
 
 
 if __name__ == '__main__':
@@ -58,6 +58,60 @@ def simulate(M, verbose):
     return pay
 
 
+def simulate_chunks(M, trials, rng, chunk=10000000):
+    """(int, int, Generator [,int]): iterator of arrays
+
+    Yield, chunk by chunk, the payoff exponents k (the game pays 2**k) of
+    'trials' games. The first heads comes at a geometric(1/2) toss, drawn
+    directly instead of tossing M coins; M tails in a row pay 2**M as well.
+    """
+    done = 0
+    while done < trials:
+        size = min(chunk, trials - done)
+        yield np.minimum(rng.geometric(0.5, size), M)
+        done += size
+
+
+class RunningPayoff:
+    """Average payoff after every trial, in O(1) memory.
+
+    Keeps the exact total paid, the largest payoff, the min/max of the
+    running average and that average at about 'points' trials spread over
+    1..trials, which is all the convergence plot needs.
+    """
+
+    def __init__(self, trials, points=2000):
+        self.count   = 0
+        self.total   = 0
+        self.max_pay = 0
+        self.min_avg = np.inf
+        self.max_avg = -np.inf
+        self.marks   = np.unique(np.linspace(1, trials, min(points, trials)).astype(np.int64))
+        self.x       = []
+        self.y       = []
+
+    def add(self, exponents):
+        """(array of int): None  add the next games, given their payoff exponents"""
+        n = len(exponents)
+        if not n:
+            return
+        counts = np.bincount(exponents)
+        pays = np.ldexp(1.0, exponents)
+        running = (float(self.total) + np.cumsum(pays)) / np.arange(self.count + 1, self.count + n + 1)
+        self.min_avg = min(self.min_avg, running.min())
+        self.max_avg = max(self.max_avg, running.max())
+        marks = self.marks[(self.marks > self.count) & (self.marks <= self.count + n)]
+        self.x.extend(marks.tolist())
+        self.y.extend(running[marks - self.count - 1].tolist())
+        # exact integer total, whatever the size of the payoffs
+        self.total += sum(int(c) << k for k, c in enumerate(counts.tolist()) if c)
+        self.max_pay = max(self.max_pay, 2 ** (len(counts) - 1))
+        self.count += n
+
+    def mean(self):
+        return self.total / self.count
+
+
 def main():
     # Get command-line arguments
     parser = argparse.ArgumentParser(
@@ -68,32 +122,43 @@ def main():
                         help='number of trials to perform')
     parser.add_argument('--verbose', default=False, action='store_true',
                         help='display the results of each trial')
+    parser.add_argument('--chunk', default=10000000, type=int, metavar='int',
+                        help='games per NumPy chunk')
+    parser.add_argument('--points', default=2000, type=int, metavar='int',
+                        help='points kept for the convergence plot')
+    parser.add_argument('--seed', default=None, type=int, metavar='int',
+                        help='random seed for the chunks')
+    parser.add_argument('--no-plot', default=False, action='store_true',
+                        help='only print the statistics')
     args = parser.parse_args()
+    if args.chunk < 1:
+        parser.error('--chunk must be at least 1')
 
     print('Simulating St Petersburg for Maximum Payoff {} (${:,}) {:,} trials...'.format(args.M, 2 ** args.M, args.trials))
 
     # Carry out the trials
-    total_paid   = 0
-    results      = np.empty(0)
-    max_pay      = 0
-    for i in range(args.trials):
-        # First, do a trial where the contestant never switches.
-        won          = simulate(args.M, verbose=args.verbose)
-        max_pay      = max(won,max_pay)
-        total_paid  += won
-        results      = np.append(results,total_paid/(i+1))
-
-    print('M {} trials {}  Max Paid={} min/max {:.2f}/{:.2f} final value {:.4f} '.format(args.M, args.trials, max_pay, np.amin(results), np.amax(results), results[-1] ))
-    x = np.arange(0,args.trials) # Generate x-axis values
+    stats = RunningPayoff(args.trials, args.points)
+    if args.verbose:
+        # one game per call, to show the coin tosses
+        for i in range(args.trials):
+            won = simulate(args.M, verbose=args.verbose)
+            stats.add(np.array([int(won).bit_length() - 1]))
+    else:
+        for exponents in simulate_chunks(args.M, args.trials, np.random.default_rng(args.seed), args.chunk):
+            stats.add(exponents)
+
+    print('M {} trials {}  Max Paid={} min/max {:.2f}/{:.2f} final value {:.4f} '.format(args.M, args.trials, stats.max_pay, stats.min_avg, stats.max_avg, stats.mean() ))
+    if args.no_plot:
+        return
     plt.figure(figsize=(10, 5), dpi=240)
-    plt.plot(x,results,'r')
+    plt.plot(stats.x,stats.y,'r')
     fig = plt.gcf()
     ax  = plt.gca()
     plt.title('St Petersburg Simulation', fontname='Times New Roman',fontweight='bold')
     plt.xlabel('Trial')
     plt.ylabel('average payoff')
-    plt.axhline(y=args.M, xmin=0, xmax=args.trials, hold=None, c='blue',linewidth=0.5, ls='dashed')
-    plt.text(args.trials/2, args.M/2, 'Max pay {:,} ({:.2f}/{:.2f})'.format(max_pay,np.amin(results), np.amax(results)))
+    plt.axhline(y=args.M, xmin=0, xmax=args.trials, c='blue',linewidth=0.5, ls='dashed')
+    plt.text(args.trials/2, args.M/2, 'Max pay {:,} ({:.2f}/{:.2f})'.format(stats.max_pay,stats.min_avg, stats.max_avg))
     plt.show()
     
     #fig.set_size_inches(10,5)
@@ -18,6 +18,7 @@ Tijms, Henk (2012-06-14). Understanding Probability (p. 76). Cambridge Universit
 """
 
 import argparse
+import math
 import numpy as np
 import matplotlib.pyplot as plt
 import sys
@@ -41,6 +42,52 @@ def simulate(N, D, r, verbose):
     return True
 
 
+def simulate_batch(N, D, r, trials, rng, wrap=True):
+    """(int, int, int, int, Generator [,bool]): int
+        Assigns birthdays in 0..D-1 to a (trials x N) matrix, sorts every row and compares all the gaps
+        between consecutive birthdays with r at once; with wrap the gap from the last birthday around
+        the year end to the first one counts too, as in the exact formula.
+        Returns the number of trials where no two birthdays are r or less days apart
+    """
+
+    dtype    = np.int16 if D < 2 ** 15 else np.int64
+    days     = np.sort(rng.integers(0, D, size=(trials, N), dtype=dtype), axis=1)
+    apart    = (np.diff(days, axis=1) > r).all(axis=1)
+    if wrap and N > 1:
+        apart &= (days[:, 0].astype(np.int64) + D - days[:, -1]) > r
+    return int(np.count_nonzero(apart))
+
+
+def simulate_trials(N, D, r, trials, rng, wrap=True, chunk=10000000):
+    """(int, int, int, int, Generator [,bool, int]): int
+        simulate_batch() over 'trials' groups, at most 'chunk' birthdays per batch
+    """
+
+    rows  = max(1, chunk // max(N, 1))
+    apart = 0
+    done  = 0
+    while done < trials:
+        size   = min(rows, trials - done)
+        apart += simulate_batch(N, D, r, size, rng, wrap)
+        done  += size
+    return apart
+
+
+def exact_pnr(N, D, r):
+    """(int, int, int): float
+        Probability p_n(r) that at least two of N birthdays in a year of D days are within r days of
+        each other (Naus). The factorials go through log-gamma so any N, D and r can be evaluated:
+            1 - p_n(r) = (D - 1 - N r)! / (D^(N-1) (D - (r+1) N)!)
+    """
+
+    if N < 2:
+        return 0.0
+    if D - (r + 1) * N < 0:
+        return 1.0
+    lognot = math.lgamma(D - N * r) - (N - 1) * math.log(D) - math.lgamma(D - (r + 1) * N + 1)
+    return -math.expm1(lognot)
+
+
 def main():
     # Get command-line arguments
     parser = argparse.ArgumentParser(
@@ -55,13 +102,35 @@ def main():
                         help='number of trials to perform')
     parser.add_argument('--verbose', default=False, action='store_true',
                         help='display the results of each trial')
+    parser.add_argument('--loop', default=False, action='store_true',
+                        help='one group per call instead of NumPy batches (implied by --verbose)')
+    parser.add_argument('--no-wrap', default=False, action='store_true',
+                        help='batches ignore the gap around the year end, like the loop does')
+    parser.add_argument('--chunk', default=10000000, type=int, metavar='int',
+                        help='birthdays per NumPy batch')
+    parser.add_argument('--seed', default=None, type=int, metavar='int',
+                        help='random seed for the batches')
+    parser.add_argument('--sweep', default=False, action='store_true',
+                        help='exact and simulated p_n(r) for every group size up to N')
     args = parser.parse_args()
+    if args.chunk < 1:
+        parser.error('--chunk must be at least 1')
+
+    if args.sweep:
+        rng = np.random.default_rng(args.seed)
+        print('   n  exact p_n({})  simulated ({:,} trials)'.format(args.r, args.trials))
+        for n in range(2, args.N + 1):
+            apart = simulate_trials(n, args.D, args.r, args.trials, rng, not args.no_wrap, args.chunk) if args.trials else 0
+            print('{:4d}  {:.6f}      {:.6f}'.format(n, exact_pnr(n, args.D, args.r), 1 - apart / args.trials if args.trials else float('nan')))
+        return
 
     print('Simulating Birthday Paradox for {} people with {} days and {} days apart {:,} trials...'.format(args.N, args.D, args.r, args.trials))
 
     # Carry out the trials
     total_match = 0
-    for i in range(args.trials):
+    if not (args.loop or args.verbose):
+        total_match = simulate_trials(args.N, args.D, args.r, args.trials, np.random.default_rng(args.seed), not args.no_wrap, args.chunk)
+    for i in range(args.trials if args.loop or args.verbose else 0):
         if i % 50   == 0 and i != 0: print('-+-',end='');
         if i % 2000 == 0 and i != 0: print('***2000***');
         sys.stdout.flush()
@@ -73,8 +142,9 @@ def main():
     print('-+-\nDone\n')
 
     print('Probability of not two birthdays {} days apart ({:,} people and {:,} days) {:.6f}  {:.2f}% [at least two {:.2f}%]'.format(args.r, args.N, args.D, total_match / args.trials, total_match / args.trials * 100, (1 - total_match / args.trials) * 100))
-    #pnr = lambda D, N, r: (1 - np.math.factorial(D - 1 - N * r) / (np.power(D, N - 1) * np.math.factorial(D - N * (r + 1))))
-    #print ('Theoretical formula: {:.6f} '.format(pnr(args.D,args.N,args.r))) 
+    pnr = exact_pnr(args.N, args.D, args.r)
+    stderr = math.sqrt(pnr * (1 - pnr) / args.trials)
+    print ('Theoretical formula: {:.6f} (simulated at least two {:.6f}, {:+.2f} se)'.format(pnr, 1 - total_match / args.trials, (1 - total_match / args.trials - pnr) / stderr if stderr else 0.0))
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -36,7 +36,7 @@ def simulate(p, a, b, x, verbose):
     """
 
     segment     = np.zeros(shape=(1+a+b-x),dtype=np.int16)
-    segment[a]  = 1                                                 # visited from start...
+    segment[a-x] = 1                                                # visited from start...
     n           = 0                                                 # initialize total movements
     k           = 0                                                 # initialize return to a to zero
     q           = a                                                 # bankroll to start
@@ -61,8 +61,69 @@ def simulate(p, a, b, x, verbose):
     return [n,q,k,v,m,z]
 
 
+def simulate_batch(p, a, b, x, walks, rng, block=64):
+    """(real, int, int, int, int, Generator [,int]): (array, array, array, array, array, array)
+        Runs 'walks' random walks of simulate() at once, 'block' steps at a time: the positions of a block
+        are the cumulative sums of +-1 steps, the first absorbing position of every walk masks the steps
+        after it, and only the walks still between x and a + b go on to the next block.
+        A walk visits every station between its min z and max m, so v = (a + b - x) - (m - z).
+        Returns the arrays [n, q, k, v, m, z] with one entry per walk
+    """
+
+    n      = np.zeros(walks, dtype=np.int64)
+    q      = np.full(walks, a, dtype=np.int64)
+    k      = np.zeros(walks, dtype=np.int64)
+    m      = np.full(walks, a, dtype=np.int64)
+    z      = np.full(walks, a, dtype=np.int64)
+    live   = np.flatnonzero((q > x) & (q < a + b))
+    steps  = np.arange(1, block + 1)
+
+    while len(live):
+        moves  = np.where(rng.random((len(live), block)) < p, 1, -1).astype(np.int32)
+        path   = q[live, None] + np.cumsum(moves, axis=1, dtype=np.int32)
+        out    = (path <= x) | (path >= a + b)
+        ended  = out.any(axis=1)
+        used   = np.where(ended, out.argmax(axis=1) + 1, block)     # steps taken in this block
+        valid  = steps <= used[:, None]
+        n[live] += used
+        q[live]  = path[np.arange(len(live)), used - 1]
+        k[live] += np.count_nonzero(valid & (path == a), axis=1)
+        m[live]  = np.maximum(m[live], np.where(valid, path, x).max(axis=1))
+        z[live]  = np.minimum(z[live], np.where(valid, path, a + b).min(axis=1))
+        live     = live[~ended]
+
+    v  = (a + b - x) - (m - z)
+    return [n,q,k,v,m,z]
+
+
+def simulate_trials(p, a, b, x, trials, rng, chunk=10000000, block=64):
+    """(real, int, int, int, int, Generator [,int, int]): (array, array, array, array, array, array)
+        simulate_batch() for 'trials' walks, at most 'chunk' positions (walks x block) per batch
+    """
+
+    walks = max(1, chunk // block)
+    parts = [simulate_batch(p, a, b, x, min(walks, trials - i), rng, block) for i in range(0, trials, walks)]
+    return [np.concatenate(stat) for stat in zip(*parts)] if parts else [np.zeros(0, dtype=np.int64)] * 6
+
+
+def ruin_probability(p, a, b, x=0):
+    """(real, int, int [,int]): real
+        Closed form probability of going broke (reaching x) before reaching a + b, starting at a:
+        with i = a - x, N = a + b - x and r = q/p, winning is (1 - r^i) / (1 - r^N), or i / N when p = 1/2.
+        For p < 1/2 the same expression is evaluated with s = p/q so that no power overflows
+    """
+
+    i, N = a - x, a + b - x
+    if p == 0.5:
+        return 1 - i / N
+    if p > 0.5:
+        r = (1 - p) / p
+        return 1 - (1 - r ** i) / (1 - r ** N)
+    s = p / (1 - p)
+    return 1 - (s ** (N - i) - s ** N) / (1 - s ** N)
+
+
 def main():
-    np.random.seed()
     # Get command-line arguments
     parser = argparse.ArgumentParser(description='simulate the Gamblers Ruin Random Walk Problem')
     parser.add_argument('--p', default=0.5, type=float, metavar='float',
@@ -77,20 +138,46 @@ def main():
                         help='number of trials to perform')
     parser.add_argument('--verbose', default=False, action='store_true',
                         help='display the results of each trial')
+    parser.add_argument('--loop', default=False, action='store_true',
+                        help='one walk per call instead of NumPy batches (implied by --verbose)')
+    parser.add_argument('--block', default=64, type=int, metavar='int',
+                        help='steps per walk in every NumPy block')
+    parser.add_argument('--chunk', default=10000000, type=int, metavar='int',
+                        help='positions (walks x block) per NumPy batch')
+    parser.add_argument('--show', default=10, type=int, metavar='int',
+                        help='trials listed one by one in batch mode')
+    parser.add_argument('--seed', default=None, type=int, metavar='int',
+                        help='random seed')
     args = parser.parse_args()
+    if args.chunk < 1 or args.block < 1:
+        parser.error('--chunk and --block must be at least 1')
+    np.random.seed(args.seed)
 
     print('Simulating Gamblers Ruin starting with {} and desire to win {}. Winning prob={:.2f} exit game level {} --- {:,} trials...\n'.format(args.a, args.b, args.p, args.x, args.trials))
 
     # Carry out the trials
-    for i in range(args.trials):
-        (n, q, k, v, m, z) = simulate(args.p, args.a, args.b, args.x, args.verbose)
-        if q == 0: 
+    if args.loop or args.verbose:
+        stats = [simulate(args.p, args.a, args.b, args.x, args.verbose) for i in range(args.trials)]
+        stats = [np.array(stat, dtype=np.int64) for stat in zip(*stats)] if stats else [np.zeros(0, dtype=np.int64)] * 6
+        shown = args.trials
+    else:
+        stats = simulate_trials(args.p, args.a, args.b, args.x, args.trials, np.random.default_rng(args.seed), args.chunk, args.block)
+        shown = min(args.show, args.trials)
+    for (n, q, k, v, m, z) in zip(*(stat[:shown] for stat in stats)):
+        if q <= args.x: 
             print('BROKEN ',end='')
         else:
             print('WINNER ',end='')
         print('Total games played: {:,}; Final bankroll: {} ({} times going back to original amount; money max: {:,} min: {:,}; never reached {})\n'.format(n,q,k,m,z,v))
     print('Done\n')
 
+    if args.trials:
+        (n, q, k, v, m, z) = stats
+        ruin  = np.count_nonzero(q <= args.x) / args.trials
+        exact = ruin_probability(args.p, args.a, args.b, args.x)
+        print('Ruin probability: simulated {:.6f} closed form {:.6f} ({:,} trials)'.format(ruin, exact, args.trials))
+        print('Average games played: {:,.2f}; times back to original amount: {:.2f}; never reached: {:.2f}; money max: {:.2f} min: {:.2f}'.format(n.mean(), k.mean(), v.mean(), m.mean(), z.mean()))
+
 
 
 if __name__ == '__main__':